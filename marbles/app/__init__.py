@@ -4,31 +4,57 @@
 # ------------------------
 # App initialization
 
-from threading import Thread
-
-from flask import Flask, redirect, render_template, request, url_for
-from flask_login import login_required, login_user, logout_user
-
-from .db_connector import (activateEmail, activateSeries, activateVideo,
-                           addAdmin, addEmail, addRace, addRacer, addResult,
-                           addVideo, deactivateEmail, deleteVideo, getAdmin,
-                           getEmail, getRace, getRacer, getResult, getSeries,
-                           getTotalWins, getUserFriendlyRacers,
-                           getUserFriendlyRaces, getUserFriendlySeries,
-                           getVideo, setSeriesWinner, toggleRacer,
-                           verifyAdminAuth)
+from functools import partial
+from io import TextIOWrapper
+from os import environ
+
+from flask import (Flask, Response, abort, jsonify, redirect, render_template,
+                   request, stream_with_context, url_for)
+from flask_login import current_user, login_required, login_user, logout_user
+from flask_wtf.csrf import generate_csrf
+
+from .broadcast import broadcaster
+from .cache import HISTORY_KEY, INDEX_KEY, cache
+from .commands import marbles
+from .conditional import conditional
+from .db_connector import (EXPORTS, TABLE_PAGES, activateEmail, activateSeries,
+                           activateVideo, addAdmin, addEmail, addOutbox,
+                           addOutboxBulk, addRace, addRacer, addResult,
+                           addVideo, deactivateEmail, deleteVideo, getEmail,
+                           getTablePage, getTablePageOptions, getVideo,
+                           setSeriesWinner, streamExport, toggleRacer)
+from .exporter import FORMATS as EXPORT_FORMATS
+from .exporter import export
 from .forms import (EmailAlertForm, ManageVideoForm, SignInForm, SignUpForm,
                     activateSeriesForm, addRacerForm, addVideoForm,
-                    contactForm, csrf, sendEmailForm, seriesWinnerForm,
-                    toggleActiveRacerForm, updateRaceDataForm)
+                    contactForm, csrf, importResultsForm, sendEmailForm,
+                    seriesWinnerForm, toggleActiveRacerForm,
+                    updateRaceDataForm)
+from .fragments import fragments
+from .importer import importResults, readResults
+from .metrics import metrics
 from .models import db, login_manager
+from .profiler import profiler
+from .publisher import ADMIN_COOKIE, publisher
+from .registry import registry
+from .sessions import sessions
 
-from.extensions import init_db, encrypt, sendEmails, to_rgba
+from.extensions import (ADMIN_SECTIONS, HISTORY_TABLES, composeEmail,
+                        getAdminSection, getHistoryPayload, getIndexPayload)
 
+PUBLIC_TABLES = ['userFriendlyRacers', 'userFriendlyRaces',
+                 'userFriendlySeries']
 
-def create_app():
+
+def create_app(config=None):
     '''
-    Created a Flask App as per the App Factory Pattern
+    Created a Flask App as per the App Factory Pattern. Nothing here
+    touches the db; run `flask marbles bootstrap` once per deploy to
+    create, migrate and seed it.
+
+    Args:
+        config (str): Import path of the config class, defaults to
+            MARBLES_CONFIG or config.Config
 
     Returns:
         Flask App
@@ -37,24 +63,34 @@ def create_app():
     app = Flask(__name__, instance_relative_config=False,
                 template_folder='templates',
                 static_folder='static')
-    app.config.from_object('config.Config')
-    INIT_TEST_DATA = app.config['INIT_TEST_DATA']
-    INIT_ADMIN_DATA = app.config['INIT_ADMIN_DATA']
+    app.config.from_object(config or environ.get('MARBLES_CONFIG',
+                                                 'config.Config'))
+    if not app.config['SQLALCHEMY_DATABASE_URI']:
+        raise RuntimeError('Set SQLALCHEMY_DATABASE_URI, or use '
+                           'MARBLES_CONFIG=config.TestConfig for sqlite')
+    if 'SECRET_KEY' not in environ and not app.testing:
+        app.logger.warning('SECRET_KEY is not set, sign-ins and forms only '
+                           'work on the worker that served them')
 
     with app.app_context():
 
         db.init_app(app)
-        db.create_all()
-        db.session.commit()
-
-        init_db(db, testdata=INIT_TEST_DATA,
-                admin=INIT_ADMIN_DATA, commit=True)
-
         login_manager.init_app(app)
         login_manager.login_view = 'admin_signin'
         csrf.init_app(app)
+        sessions.init_app(app, db)
+        broadcaster.init_app(app, db)
+        conditional.init_app(app, db)
+        publisher.init_app(app, db)
+        cache.init_app(app)
+        fragments.init_app(app)
+        registry.init_app(app)
+        profiler.init_app(app)
+        metrics.init_app(app)
+        app.cli.add_command(marbles)
 
         @app.route('/', methods=['GET', 'POST'])
+        @conditional.page(private=True)
         def index():
             '''
             Routes user to the index page of the app.
@@ -72,56 +108,81 @@ def create_app():
                 except Exception:
                     last = False
 
-                email = addEmail(db, first, address, last, commit=True)
+                email = addEmail(db, first, address, last)
                 site_url = app.config['SITE_URL']
                 confirmation_href = f'{site_url}/email_confirm/{email.address}'
                 subject = "Verify Your Email Address"
                 content = f"Please <a href={confirmation_href}>click here</a> to \
                     confirm your email address."
-                thread = Thread(target=sendEmails, args=[
-                    app, email, subject, content])
-                thread.start()
+                addOutbox(db, *composeEmail(app, email, subject, content,
+                                            unsubscribe=False), commit=True)
 
                 return redirect(url_for('index'))
 
-            racers = getRacer(active=True)
-            activeSeries = getSeries(active=True)
-            if activeSeries.winner_id:
-                winner = getRacer(id=activeSeries.winner_id)
-                winner = f': Winner {winner.name}!'
-            else:
-                winner = ''
-            totalStandings = getTotalWins(db, activeSeries=activeSeries)
-            names = []
-            wins = []
-            borderWidths = []
-            backgroundColors = []
-            hoverColors = []
-            borderColors = []
-            for racer in totalStandings:
-                names.append(racer.name)
-                wins.append(racer.wins)
-                borderWidths.append(1.5)
-                backgroundColors.append(to_rgba(racer.color, 0.4))
-                hoverColors.append(to_rgba(racer.color, 0.7))
-                borderColors.append(to_rgba(racer.color, 1))
-
+            payload = cache.cached(INDEX_KEY, lambda: getIndexPayload(db))
             showMainAlerts = app.config['SHOW_MAIN_ALERTS']
-            activeVideo = getVideo(active=True)
             return render_template('index.html',
                                    title='The Marble Race',
                                    showMainAlerts=showMainAlerts,
                                    form=form,
-                                   racers=racers,
-                                   activeSeries=activeSeries.name,
-                                   winner=winner,
-                                   borderWidths=borderWidths,
-                                   backgroundColors=backgroundColors,
-                                   hoverColors=hoverColors,
-                                   borderColors=borderColors,
-                                   names=names,
-                                   wins=wins,
-                                   activeVideo=activeVideo)
+                                   **payload)
+
+        @app.route('/standings')
+        @conditional.page()
+        def standings():
+            '''
+            Returns the active series' standings chart, polled by viewers
+            that can't hold a /standings/stream open.
+
+            Returns:
+                JSON
+            '''
+            payload = cache.cached(INDEX_KEY, lambda: getIndexPayload(db))
+            return jsonify({key: value for key, value in payload.items()
+                            if key != 'activeVideo'})
+
+        @app.route('/standings/stream')
+        def standings_stream():
+            '''
+            Streams the active series' standings as Server-Sent Events:
+            the current chart, then every change as it is committed.
+            '''
+            subscriber = broadcaster.subscribe()
+            if subscriber is None:
+                # the page keeps its chart, it just stops updating
+                return Response(status=503, headers={'Retry-After': '60'})
+
+            payload = cache.cached(INDEX_KEY, lambda: getIndexPayload(db))
+            return Response(broadcaster.stream(subscriber, payload),
+                            mimetype='text/event-stream',
+                            headers={
+                                'Cache-Control': 'no-cache',
+                                'X-Accel-Buffering': 'no',
+                            })
+
+        @app.route('/standings/history')
+        @conditional.page()
+        def standings_history():
+            '''
+            Returns the cumulative wins of each racer, race by race, in the
+            series given by ?series= (defaults to the active series).
+
+            Returns:
+                JSON
+            '''
+            series = request.args.get('series', type=int)
+            if series is None:
+                series = registry.activeSeries().id
+            elif registry.find('series', series) is None:
+                abort(404)
+            if series is None:
+                return jsonify(series=None, first=None, last=None, racers=[])
+
+            versions = conditional.current()['tables']
+            key = HISTORY_KEY.format(series, '.'.join(
+                str(versions.get(table, 0)) for table in HISTORY_TABLES))
+            return jsonify(cache.cached(
+                key, lambda: getHistoryPayload(db, series)))
 
         @app.route('/admin', methods=['GET', 'POST'])
         @login_required
@@ -140,6 +201,7 @@ def create_app():
             winnerForm = seriesWinnerForm()
             videoForm = addVideoForm()
             manageVideoForm = ManageVideoForm()
+            importForm = importResultsForm()
 
             try:
                 subject = request.form['subject']
@@ -180,10 +242,10 @@ def create_app():
 
             if formType == 'manageVideo':
                 if manageVideoForm.delete.data:
-                    video = getVideo(id=video_id)
+                    video = registry.find('videos', video_id)
                     deleteVideo(db, video, commit=True)
                 if manageVideoForm.submit.data:
-                    video = getVideo(id=video_id)
+                    video = registry.find('videos', video_id)
                     activateVideo(video)
                 return redirect(url_for('admin'))
 
@@ -207,7 +269,7 @@ def create_app():
                     if 'edit' in button_type:
                         # delete video if editing
                         video_id = button_type[4:]
-                        video = getVideo(id=video_id)
+                        video = registry.find('videos', video_id)
                         deleteVideo(db, video, commit=True)
                     video = addVideo(db, groupname, name, description,
                                      url, include_media, set_active,
@@ -218,8 +280,8 @@ def create_app():
             if formType == 'seriesWinner':
                 # series, winner set in try block
                 if winnerForm.validate_on_submit():
-                    series = getSeries(id=series)
-                    racer = getRacer(id=winner)
+                    series = registry.find('series', series)
+                    racer = registry.find('racers', winner)
                     setSeriesWinner(series, racer)
                     return redirect(url_for('admin'))
 
@@ -238,7 +300,7 @@ def create_app():
             if formType == 'activateSeries':
                 if seriesForm.validate_on_submit():
                     # series already set in try block
-                    series = getSeries(id=series)
+                    series = registry.find('series', series)
                     activateSeries(series)
                     return redirect(url_for('admin'))
 
@@ -248,11 +310,11 @@ def create_app():
                     greeting = True
                     unsubscribe = True
                     emails = getEmail(active=True)
-                    for email in emails:
-                        thread = Thread(target=sendEmails, args=[
-                            app, email, subject, content, greeting,
-                            unsubscribe])
-                        thread.start()
+                    addOutboxBulk(db, [
+                        composeEmail(app, email, subject, content, greeting,
+                                     unsubscribe)
+                        for email in emails
+                    ], commit=True)
                     return redirect(url_for('admin'))
 
             if formType == 'updateRaces':
@@ -262,28 +324,15 @@ def create_app():
                     date = request.form.get('date')
                     winner = request.form.get('winner')
 
-                    race = addRace(db, race_number, date, cup, commit=True)
-                    racer = getRacer(id=winner)
-                    series = getSeries(name=cup)
-                    addResult(db, race.id, racer.id, series.id, commit=True)
+                    # race, series and result go in one transaction
+                    race = addRace(db, race_number, date, cup)
+                    addResult(db, race.id, int(winner), race.series_id,
+                              commit=True)
 
                     return redirect(url_for('admin'))
 
-            userFriendlyRacers = getUserFriendlyRacers(db)
-            userFriendlyRaces = getUserFriendlyRaces(db)
-            userFriendlySeries = getUserFriendlySeries(db)
-            admins = getAdmin(all=True)
-            races = getRace(all=True)
-            racers = getRacer(all=True)
-            results = getResult(all=True)
-            emails = getEmail(all=True)
-            serieses = getSeries(all=True)
-            videos = getVideo(all=True)
-            cups = [series.name for series in serieses]
-            groupnames = set([video.groupname for video in videos])
-            activeSeries = getSeries(active=True)
-            activeVideo = getVideo(active=True)
-
+            # choices, lists and the next race number are fetched by the
+            # page from admin_section, the tables from table_page
             return render_template('admin.html',
                                    title='Admin',
                                    form=form,
@@ -294,20 +343,49 @@ def create_app():
                                    winnerForm=winnerForm,
                                    videoForm=videoForm,
                                    manageVideoForm=manageVideoForm,
-                                   cups=cups,
-                                   serieses=serieses,
-                                   activeSeries=activeSeries,
-                                   userFriendlyRacers=userFriendlyRacers,
-                                   userFriendlyRaces=userFriendlyRaces,
-                                   userFriendlySeries=userFriendlySeries,
-                                   admins=admins,
-                                   races=races,
-                                   racers=racers,
-                                   results=results,
-                                   emails=emails,
-                                   videos=videos,
-                                   groupnames=groupnames,
-                                   activeVideo=activeVideo)
+                                   importForm=importForm)
+
+        @app.route('/admin/sections/<section>')
+        @login_required
+        def admin_section(section):
+            '''
+            Returns the reference data for one section of the admin page
+            as JSON, revalidated by ETag.
+            '''
+            if section not in ADMIN_SECTIONS:
+                abort(404)
+
+            response = jsonify(getAdminSection(section))
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.add_etag()
+            return response.make_conditional(request)
+
+        @app.route('/admin/import', methods=['POST'])
+        @login_required
+        def admin_import():
+            '''
+            Imports an uploaded CSV/JSON file of race results in one
+            transaction and reports how fast it was written.
+
+            Returns:
+                JSON import stats, or the form errors with a 400
+            '''
+            importForm = importResultsForm()
+            if not importForm.validate_on_submit():
+                return jsonify(errors=importForm.errors), 400
+
+            upload = importForm.file.data
+            format = upload.filename.rsplit('.', 1)[-1].lower()
+            stream = TextIOWrapper(upload.stream, encoding='utf-8-sig')
+            try:
+                stats = importResults(db, readResults(stream, format),
+                                      commit=True)
+            except ValueError as error:
+                return jsonify(errors={'file': [str(error)]}), 400
+
+            app.logger.info(f'Imported results: {stats}')
+            return jsonify(stats)
 
         @app.route('/sign-in', methods=['GET', 'POST'])
         def admin_signin():
@@ -320,15 +398,14 @@ def create_app():
             form = SignInForm()
 
             if form.validate_on_submit():
-                username = request.form.get('username')
-                password = encrypt(request.form.get('password'))
-
-                if verifyAdminAuth(username, password, encrypted=True):
-                    admin = getAdmin(username)
-                    login_user(admin)
+                # the validator already looked up the admin
+                login_user(form.admin)
+                sessions.regenerate()
 
-                    next = request.args.get('next')
-                    return redirect(next or url_for('admin'))
+                next = request.args.get('next')
+                response = redirect(next or url_for('admin'))
+                response.set_cookie(ADMIN_COOKIE, '1', httponly=True)
+                return response
 
             return render_template('signin.html',
                                    title='Sign-In',
@@ -356,8 +433,11 @@ def create_app():
                 admin = addAdmin(db, username, password, name=name,
                                  encrypted=False, commit=True)
                 login_user(admin)
+                sessions.regenerate()
 
-                return redirect(url_for('admin'))
+                response = redirect(url_for('admin'))
+                response.set_cookie(ADMIN_COOKIE, '1', httponly=True)
+                return response
 
             return render_template('signup.html',
                                    title='Sign-Up',
@@ -371,7 +451,20 @@ def create_app():
             sign-in page
             '''
             logout_user()
-            return redirect(url_for('admin_signin'))
+            sessions.regenerate()
+            response = redirect(url_for('admin_signin'))
+            response.delete_cookie(ADMIN_COOKIE)
+            return response
+
+        @app.route('/csrf-token')
+        def csrf_token():
+            '''
+            Returns a CSRF token for this visitor's session, for forms on
+            published pages, which can't carry one of their own.
+            '''
+            response = jsonify(csrf_token=generate_csrf())
+            response.cache_control.no_store = True
+            return response
 
         @app.route('/about')
         def about():
@@ -390,28 +483,60 @@ def create_app():
                                    title='Site Info')
 
         @app.route('/data')
+        @conditional.page()
         def data():
             '''
             Routes a user to the Data Tables page
             '''
-            userFriendlyRacers = getUserFriendlyRacers(db)
-            userFriendlyRaces = getUserFriendlyRaces(db)
-            userFriendlySeries = getUserFriendlySeries(db)
-            admins = getAdmin(all=True)
-            races = getRace(all=True)
-            racers = getRacer(all=True)
-            results = getResult(all=True)
-            emails = getEmail(all=True)
             return render_template('data.html',
-                                   title='Data',
-                                   userFriendlyRacers=userFriendlyRacers,
-                                   userFriendlyRaces=userFriendlyRaces,
-                                   userFriendlySeries=userFriendlySeries,
-                                   admins=admins,
-                                   races=races,
-                                   racers=racers,
-                                   results=results,
-                                   emails=emails)
+                                   title='Data')
+
+        @app.route('/tables/<table>')
+        def table_page(table):
+            '''
+            Returns one page of a data table as rendered HTML, along with
+            its sort column and order. The next page's cursor is in the
+            HTML. Raw tables require a logged-in admin.
+            '''
+            if table not in TABLE_PAGES:
+                abort(404)
+            if table not in PUBLIC_TABLES:
+                if not current_user.is_authenticated:
+                    return login_manager.unauthorized()
+
+            options = getTablePageOptions(table,
+                                          sort=request.args.get('sort'),
+                                          order=request.args.get('order'),
+                                          after=request.args.get('after'),
+                                          search=request.args.get('search'))
+            # only queried when the table's fragment isn't cached
+            html = render_template(f'table-{table}.html',
+                                   tables=TABLE_PAGES[table]['tables'],
+                                   options=options,
+                                   loadPage=partial(getTablePage, db,
+                                                    **options))
+            return jsonify(html=html,
+                           sort=options['sort'],
+                           order=options['order'])
+
+        @app.route('/export/<table>.<format>')
+        def export_table(table, format):
+            '''
+            Streams every row of races, results or standings as CSV or
+            JSON, starting the response before the query has finished.
+            '''
+            if table not in EXPORTS or format not in EXPORT_FORMATS:
+                abort(404)
+
+            chunks = export(streamExport(db, table), format)
+            return Response(stream_with_context(chunks),
+                            mimetype=EXPORT_FORMATS[format],
+                            headers={
+                                'Content-Disposition':
+                                    f'attachment; filename={table}.{format}',
+                                # let nginx pass chunks on as they come
+                                'X-Accel-Buffering': 'no',
+                            })
 
         @app.route('/contact', methods=['GET', 'POST'])
         def contact():
@@ -429,9 +554,9 @@ def create_app():
                 content = header + content
 
                 email = app.config['GMAIL_USERNAME']
-                thread = Thread(target=sendEmails, args=[
-                    app, email, subject, content, False])
-                thread.start()
+                addOutbox(db, *composeEmail(app, email, subject, content,
+                                            greeting=False,
+                                            unsubscribe=False), commit=True)
 
                 return redirect(url_for('index'))
 
@@ -440,6 +565,7 @@ def create_app():
                                    form=form)
 
         @app.route('/media', methods=['GET', 'POST'])
+        @conditional.page()
         def media():
             '''
             Routes a user to the Media page
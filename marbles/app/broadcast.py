@@ -0,0 +1,214 @@
+# broadcast.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Live standings for the index page chart, pushed to
+# viewers as Server-Sent Events. Write helpers publish
+# small deltas inside their transaction; on Postgres
+# they go out with NOTIFY on commit and every worker
+# LISTENs, so viewers on any worker (or container)
+# see every change.
+
+import json
+from queue import Empty, Full, Queue
+from select import select
+from threading import Lock, Thread
+from time import monotonic, sleep
+
+from sqlalchemy import event
+
+CHANNEL = 'standings'
+
+
+def formatEvent(event, data):
+    '''
+    Returns:
+        str - one event in text/event-stream format
+    '''
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+class Subscriber:
+    '''
+    Events waiting to be sent to one viewer. A viewer that falls too far
+    behind is closed, and reconnects to a fresh snapshot.
+    '''
+
+    def __init__(self, maxsize=100):
+        self.queue = Queue(maxsize)
+        self.closed = False
+
+    def put(self, event, data):
+        try:
+            self.queue.put_nowait((event, data))
+        except Full:
+            self.closed = True
+
+    def get(self, timeout):
+        return self.queue.get(timeout=timeout)
+
+
+class Broadcaster:
+    '''
+    Fans standings events out to the viewers connected to this process.
+    Call init_app() from the app factory; the listener thread starts
+    with the first request each worker handles.
+    '''
+
+    def __init__(self):
+        self.app = None
+        self.db = None
+        self.subscribers = set()
+        self.lock = Lock()
+        self.thread = None
+        self.local = Queue()
+
+    def init_app(self, app, db):
+        self.app = app
+        self.db = db
+        self.maxClients = app.config['SSE_MAX_CLIENTS']
+        self.heartbeat = app.config['SSE_HEARTBEAT']
+        self.timeout = app.config['SSE_TIMEOUT']
+        if not event.contains(db.session, 'after_commit', self.after_commit):
+            event.listen(db.session, 'after_commit', self.after_commit)
+            event.listen(db.session, 'after_rollback', self.after_rollback)
+        app.before_request(self.start)
+
+    def publish(self, event, data):
+        '''
+        Queue an event in the current transaction. It is only sent once
+        the transaction commits.
+
+        Args:
+            event (str): wins, winner, refresh or version (not sent to
+                viewers, see app/conditional.py and app/publisher.py)
+            data (dict): JSON serializable event data
+        '''
+        message = json.dumps({'event': event, 'data': data})
+        if self.db.session.get_bind().dialect.name == 'postgresql':
+            self.db.session.execute('SELECT pg_notify(:channel, :message);',
+                                    {'channel': CHANNEL, 'message': message})
+        else:
+            pending = self.db.session.info.setdefault('broadcast', [])
+            if message not in pending:
+                pending.append(message)
+
+    def after_commit(self, session):
+        for message in session.info.pop('broadcast', []):
+            self.local.put(message)
+
+    def after_rollback(self, session):
+        session.info.pop('broadcast', None)
+
+    def start(self):
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = Thread(target=self.run, name='broadcast',
+                                     daemon=True)
+                self.thread.start()
+
+    def subscribe(self):
+        '''
+        Returns:
+            Subscriber - or None when this worker already streams to
+            SSE_MAX_CLIENTS viewers
+        '''
+        with self.lock:
+            if len(self.subscribers) >= self.maxClients:
+                return None
+            subscriber = Subscriber()
+            self.subscribers.add(subscriber)
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def stream(self, subscriber, snapshot):
+        '''
+        Yield the events of one viewer's connection: the current
+        standings, then every change until SSE_TIMEOUT, with a comment
+        every SSE_HEARTBEAT seconds to keep proxies from closing it.
+
+        Args:
+            subscriber (Subscriber): Returned by subscribe()
+            snapshot (dict): Current index page payload
+
+        Returns:
+            generator(str)
+        '''
+        try:
+            yield 'retry: 5000\n'
+            yield formatEvent('standings', snapshot)
+            closes = monotonic() + self.timeout
+            while not subscriber.closed and monotonic() < closes:
+                try:
+                    event, data = subscriber.get(self.heartbeat)
+                except Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield formatEvent(event, data)
+        finally:
+            self.unsubscribe(subscriber)
+
+    def run(self):
+        while True:
+            try:
+                if self.app.config['SQLALCHEMY_DATABASE_URI'].startswith(
+                        'postgres'):
+                    messages = self.listen()
+                else:
+                    messages = iter(self.local.get, None)
+                for message in messages:
+                    self.dispatch(message)
+            except Exception:
+                self.app.logger.exception('Standings listener failed')
+                sleep(5)
+            # anything sent while reconnecting was missed
+            self.dispatch(json.dumps({'event': 'refresh', 'data': {}}))
+
+    def listen(self):
+        with self.app.app_context():
+            connection = self.db.engine.raw_connection()
+        try:
+            connection.connection.autocommit = True
+            cursor = connection.cursor()
+            cursor.execute(f'LISTEN {CHANNEL};')
+            while True:
+                select([connection.connection], [], [], self.heartbeat)
+                connection.connection.poll()
+                while connection.connection.notifies:
+                    yield connection.connection.notifies.pop(0).payload
+        finally:
+            connection.invalidate()
+
+    def dispatch(self, message):
+        from .cache import INDEX_KEY, VERSION_KEY, cache
+        from .extensions import getIndexPayload
+        from .publisher import publisher
+
+        message = json.loads(message)
+        event, data = message['event'], message['data']
+        with self.app.app_context():
+            # another worker may have made the change
+            cache.delete(INDEX_KEY, VERSION_KEY)
+            if event == 'version':
+                publisher.schedule()
+                return
+            if not self.subscribers:
+                return
+            if event == 'refresh':
+                event = 'standings'
+                data = cache.cached(INDEX_KEY,
+                                    lambda: getIndexPayload(self.db))
+                self.db.session.remove()
+
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.put(event, data)
+
+
+broadcaster = Broadcaster()
@@ -0,0 +1,149 @@
+# cache.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Application-level cache used to hold fully
+# computed page payloads between requests.
+# Backed by an in-process LRU by default and
+# pluggable to a shared store (redis).
+
+import json
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+from .metrics import metrics
+
+INDEX_KEY = 'index'
+ADMIN_KEY = 'admin:{}'
+VERSION_KEY = 'version'
+HISTORY_KEY = 'history:{}:{}'
+
+
+class MemoryBackend:
+    '''
+    In-process LRU store where every entry expires after its own TTL.
+    Each gunicorn worker holds its own copy.
+    '''
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = monotonic() + ttl if ttl else None
+        with self.lock:
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class RedisBackend:
+    '''
+    Shared store so that every worker (and every app container) sees the
+    same entries and the same invalidations. Values must be JSON
+    serializable.
+    '''
+
+    def __init__(self, url, prefix='marbles:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl or None)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+class Cache:
+    '''
+    Read-through cache facade. Call init_app() from the app factory to
+    pick the backend configured by CACHE_BACKEND.
+    '''
+
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.ttl = None
+
+    def init_app(self, app):
+        backend = app.config['CACHE_BACKEND']
+        if backend == 'redis':
+            self.backend = RedisBackend(app.config['CACHE_REDIS_URL'])
+        elif backend == 'memory':
+            self.backend = MemoryBackend(app.config['CACHE_MAXSIZE'])
+        else:
+            raise ValueError(f'Unknown CACHE_BACKEND: {backend}')
+        self.ttl = app.config['CACHE_TTL']
+
+    def get(self, key):
+        value = self.backend.get(key)
+        metrics.cacheLookup(key, value is not None)
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl or self.ttl)
+
+    def delete(self, *keys):
+        self.backend.delete(*keys)
+
+    def clear(self):
+        self.backend.clear()
+
+    def cached(self, key, builder, ttl=None):
+        '''
+        Return the value stored under key, calling builder() to compute
+        and store it on a miss.
+
+        Args:
+            key (str): Cache key
+            builder (callable): Computes the value on a miss
+            ttl (int): Seconds to keep the value (defaults to CACHE_TTL)
+
+        Returns:
+            The cached or freshly built value
+        '''
+        value = self.get(key)
+        if value is None:
+            value = builder()
+            self.set(key, value, ttl)
+        return value
+
+
+cache = Cache()
@@ -0,0 +1,181 @@
+# commands.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Contains the `flask marbles ...` CLI commands
+# used to maintain the db outside of a request
+
+from time import perf_counter
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import inspect
+
+from .datagen import SERIES_SIZES, WINNERS, generate
+from .db_connector import rebuildStandingHistory, rebuildStandings
+from .extensions import init_db
+from .importer import FORMATS, MAX_BATCH_SIZE, importResults, readResults
+from .migrations import downgrade, lock, stamp, status, upgrade
+from .models import db
+from .publisher import publisher
+from .sessions import sessions
+
+marbles = AppGroup('marbles', help='Marble Race maintenance commands.')
+
+
+@marbles.command('bootstrap')
+def bootstrap():
+    '''
+    Create, migrate and seed the db. Run once before starting the app
+    workers rather than in every worker (the bootstrap service in
+    docker-compose). Concurrent runs wait for each other.
+    '''
+    started = perf_counter()
+
+    with lock(db, log=click.echo):
+        fresh = 'race' not in inspect(db.engine).get_table_names()
+        db.create_all()
+        db.session.commit()
+        if fresh:
+            # a new database already matches the models
+            stamp(db)
+            click.echo('Created a new database.')
+        else:
+            upgrade(db, log=click.echo)
+
+        init_db(db, testdata=current_app.config['INIT_TEST_DATA'],
+                admin=current_app.config['INIT_ADMIN_DATA'], commit=True)
+
+    click.echo(f'Bootstrapped in {perf_counter() - started:.2f}s.')
+
+
+@marbles.command('rebuild-standings')
+def rebuild_standings():
+    '''
+    Rebuild the pre-aggregated standing table from the result table.
+    '''
+    rebuildStandings(db, commit=True)
+    click.echo('Standings rebuilt.')
+
+
+@marbles.command('backfill-history')
+@click.option('--series', type=int, multiple=True,
+              help='Id of a series to backfill (repeatable, defaults to all)')
+def backfill_history(series):
+    '''
+    Rebuild the cumulative standings history behind the progress chart
+    from the result table.
+    '''
+    written = rebuildStandingHistory(db, series=list(series), commit=True)
+    click.echo(f'Wrote {written} standing history row(s).')
+
+
+@marbles.command('sweep-sessions')
+def sweep_sessions():
+    '''
+    Remove expired server-side sessions. The app also does this every
+    SESSION_SWEEP_INTERVAL seconds.
+    '''
+    click.echo(f'Swept {sessions.sweep()} expired session(s).')
+
+
+@marbles.command('publish')
+def publish():
+    '''
+    Render the published pages to PUBLISH_DIR now. The app does this in
+    the background after every write.
+    '''
+    if not current_app.config['PUBLISH_DIR']:
+        raise click.ClickException('PUBLISH_DIR is not set.')
+    click.echo(f'Published {publisher.publish(force=True)} file(s).')
+
+
+@marbles.command('import')
+@click.argument('file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--format', 'format', type=click.Choice(FORMATS),
+              help='File format (defaults to the file extension).')
+@click.option('--batch-size', default=1000, show_default=True,
+              type=click.IntRange(1, MAX_BATCH_SIZE),
+              help='Rows written per statement.')
+def import_command(file, format, batch_size):
+    '''
+    Import races and results from a CSV or JSON file with race_number,
+    date, cup and winner columns, in a single transaction.
+    '''
+    format = format or file.name.rsplit('.', 1)[-1].lower()
+    if format not in FORMATS:
+        raise click.BadParameter(f'Use --format with one of {FORMATS}')
+
+    try:
+        stats = importResults(db, readResults(file, format),
+                              batchSize=batch_size, commit=True)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+
+    click.echo(f"Imported {stats['results']} result(s) from "
+               f"{stats['rows']} row(s), skipped {stats['skipped']}, in "
+               f"{stats['seconds']}s ({stats['rowsPerSecond']} rows/s).")
+
+
+@marbles.command('generate')
+@click.option('--racers', default=20, show_default=True)
+@click.option('--series', default=10, show_default=True)
+@click.option('--races', default=10000, show_default=True,
+              help='Races to add, each with one result.')
+@click.option('--subscribers', default=100, show_default=True)
+@click.option('--videos', default=10, show_default=True)
+@click.option('--winners', type=click.Choice(WINNERS), default='uniform',
+              show_default=True, help='How wins are spread over racers.')
+@click.option('--skew', default=1.2, show_default=True,
+              help='Exponent of the zipf winners distribution.')
+@click.option('--series-sizes', type=click.Choice(SERIES_SIZES),
+              default='even', show_default=True)
+@click.option('--seed', default=0, show_default=True)
+@click.option('--batch-size', default=10000, show_default=True,
+              help='Rows per COPY/INSERT.')
+def generate_command(racers, series, races, subscribers, videos, winners,
+                     skew, series_sizes, seed, batch_size):
+    '''
+    Add a deterministic synthetic dataset, in one transaction.
+    '''
+    added = generate(db, racers=racers, series=series, races=races,
+                     subscribers=subscribers, videos=videos,
+                     winners=winners, skew=skew, seriesSizes=series_sizes,
+                     seed=seed, batchSize=batch_size, commit=True)
+    seconds = added.pop('seconds')
+    click.echo(f'Generated {added} in {seconds}s.')
+
+
+@marbles.command('upgrade')
+@click.option('--to', 'target', type=int,
+              help='Last revision to apply (defaults to the latest).')
+def upgrade_command(target):
+    '''
+    Apply pending schema migrations.
+    '''
+    with lock(db, log=click.echo):
+        applied = upgrade(db, target=target, log=click.echo)
+    click.echo(f'{applied} migration(s) applied.')
+
+
+@marbles.command('downgrade')
+@click.option('--to', 'target', type=int,
+              help='Revision to end on (defaults to one step back).')
+def downgrade_command(target):
+    '''
+    Revert applied schema migrations.
+    '''
+    with lock(db, log=click.echo):
+        reverted = downgrade(db, target=target, log=click.echo)
+    click.echo(f'{reverted} migration(s) reverted.')
+
+
+@marbles.command('status')
+def status_command():
+    '''
+    List every schema migration and whether it has been applied.
+    '''
+    for revision, description, applied in status(db):
+        state = f'applied {str(applied)[:16]}' if applied else 'pending'
+        click.echo(f'{revision:>4}  {state:<24}  {description}')
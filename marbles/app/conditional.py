@@ -0,0 +1,231 @@
+# conditional.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Conditional GETs for the public pages. Every commit
+# that changes public data bumps one data version,
+# and the pages built from that data are tagged with
+# it, so a visitor whose copy is still current gets a
+# 304 before any of the page's queries run. Anonymous
+# copies are also marked for nginx to micro-cache.
+# Each table also keeps a version of its own, for the
+# table fragments cached by app/fragments.py.
+
+import hashlib
+from datetime import datetime
+from functools import wraps
+from os import walk
+from os.path import getmtime, join
+from time import time
+
+from flask import make_response, request, session
+from sqlalchemy import event, text
+
+# tables shown on the public pages, the rest only bump their own version
+PUBLIC_DATA = {'race', 'racer', 'result', 'series', 'standing',
+               'standing_history', 'video'}
+
+
+class Conditional:
+    '''
+    Call init_app() from the app factory, decorate each page with
+    @conditional.page() and have every write helper call bump().
+    '''
+
+    def __init__(self):
+        self.app = None
+        self.db = None
+        self.build = ''
+        self.deployed = None
+
+    def init_app(self, app, db):
+        self.app = app
+        self.db = db
+        self.ttl = app.config['DATA_VERSION_TTL']
+        self.microcache = app.config['MICROCACHE_TTL']
+        self.fingerprint(join(app.root_path, app.template_folder))
+        if not event.contains(db.session, 'before_commit',
+                              self.before_commit):
+            event.listen(db.session, 'before_commit', self.before_commit)
+            event.listen(db.session, 'after_commit', self.after_commit)
+            event.listen(db.session, 'after_rollback', self.after_rollback)
+
+    def fingerprint(self, folder):
+        '''
+        Hash the templates, so a deploy that changes a page also changes
+        its ETag even though the data did not.
+        '''
+        digest = hashlib.sha1()
+        newest = 0
+        for root, dirs, files in walk(folder):
+            dirs.sort()
+            for name in sorted(files):
+                path = join(root, name)
+                with open(path, 'rb') as file:
+                    digest.update(file.read())
+                newest = max(newest, getmtime(path))
+        self.build = digest.hexdigest()[:12]
+        self.deployed = datetime.utcfromtimestamp(int(newest))
+
+    def bump(self, *tables):
+        '''
+        Mark the current transaction as changing the given tables. Their
+        versions, and the data version if any of them is public, go up
+        once, as the transaction commits.
+
+        Args:
+            tables (str): Names of the tables written
+        '''
+        self.db.session.info.setdefault('data_version', set()).update(tables)
+
+    def before_commit(self, session):
+        from .broadcast import broadcaster
+
+        tables = session.info.pop('data_version', None)
+        if not tables:
+            return
+        # taken last, and always in the same order, so writers never wait
+        # on each other while holding these rows and another
+        now = datetime.utcnow()
+        if tables & PUBLIC_DATA:
+            session.execute(text('''
+INSERT INTO
+    data_version (id, version, updated_date)
+VALUES
+    (1, 1, :now)
+ON CONFLICT (id) DO UPDATE SET
+    version=data_version.version + 1,
+    updated_date=EXCLUDED.updated_date;
+'''), {'now': now})
+        for table in sorted(tables):
+            session.execute(text('''
+INSERT INTO
+    table_version (name, version, updated_date)
+VALUES
+    (:name, 1, :now)
+ON CONFLICT (name) DO UPDATE SET
+    version=table_version.version + 1,
+    updated_date=EXCLUDED.updated_date;
+'''), {'name': table, 'now': now})
+        # every worker drops its cached version, and re-publishes the
+        # static pages, once this commits
+        broadcaster.publish('version', {})
+        session.info['data_version_bumped'] = True
+
+    def after_commit(self, session):
+        from .cache import VERSION_KEY, cache
+        if session.info.pop('data_version_bumped', False):
+            cache.delete(VERSION_KEY)
+
+    def after_rollback(self, session):
+        session.info.pop('data_version', None)
+        session.info.pop('data_version_bumped', None)
+
+    def load(self):
+        from .models import DataVersion, TableVersion
+        row = DataVersion.query.get(1)
+        tables = {table.name: table.version
+                  for table in TableVersion.query.all()}
+        if row is None:
+            return {'version': 0, 'updated': None, 'tables': tables}
+        return {'version': row.version,
+                'updated': row.updated_date.isoformat(),
+                'tables': tables}
+
+    def current(self):
+        '''
+        Returns:
+            dict - the data version (int), when it last changed (ISO
+            timestamp, or None before the first write) and the version
+            of each table (dict)
+        '''
+        from .cache import VERSION_KEY, cache
+        if not self.ttl:
+            return self.load()
+        return cache.cached(VERSION_KEY, self.load, self.ttl)
+
+    def etag(self, version, private):
+        '''
+        Returns:
+            str - tag of the page this request gets, from the data
+            version, the templates and whoever is signed in
+        '''
+        from flask_login import current_user
+
+        parts = [self.build, str(version['version']), request.full_path]
+        if current_user.is_authenticated:
+            parts.append(str(current_user.get_id()))
+        if private:
+            # the page's CSRF token belongs to this session and expires
+            limit = self.app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+            parts.append(session.get('csrf_token', ''))
+            parts.append(str(int(time() // max(limit // 2, 1))
+                             if limit else 0))
+        return hashlib.sha1(':'.join(parts).encode()).hexdigest()[:20]
+
+    def lastModified(self, version):
+        if version['updated'] is None:
+            return self.deployed
+        return max(datetime.fromisoformat(version['updated']), self.deployed)
+
+    def shared(self, private):
+        from flask_login import current_user
+        return not private and not current_user.is_authenticated
+
+    def tag(self, response, etag, version, private):
+        response.set_etag(etag)
+        response.last_modified = self.lastModified(version)
+        # browsers always revalidate, which is answered by a 304
+        response.cache_control.no_cache = True
+        if self.shared(private):
+            response.cache_control.public = True
+            if self.microcache:
+                response.headers['X-Accel-Expires'] = str(self.microcache)
+        else:
+            response.cache_control.private = True
+        return response
+
+    def notModified(self, etag, version, private):
+        if request.if_none_match:
+            return request.if_none_match.contains_weak(etag)
+        # without an ETag the date can't tell visitors apart
+        if request.if_modified_since and self.shared(private):
+            modified = self.lastModified(version).replace(microsecond=0)
+            return request.if_modified_since >= modified
+        return False
+
+    def page(self, private=False):
+        '''
+        Decorate a view whose page only changes with the data version and
+        the signed in admin. A GET for a page the visitor already has is
+        answered with 304 before the view runs.
+
+        Args:
+            private (bool): Set True when the page holds something of the
+                visitor's own, like a CSRF token, so only their browser
+                keeps a copy
+        '''
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if (request.method not in ('GET', 'HEAD')
+                        or '_flashes' in session):
+                    return view(*args, **kwargs)
+
+                version = self.current()
+                etag = self.etag(version, private)
+                if self.notModified(etag, version, private):
+                    response = self.app.response_class(status=304)
+                    return self.tag(response, etag, version, private)
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                # rendering may have started the session's CSRF token
+                return self.tag(response, self.etag(version, private),
+                                version, private)
+            return wrapper
+        return decorator
+
+
+conditional = Conditional()
@@ -0,0 +1,237 @@
+# datagen.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Deterministic synthetic data for development and
+# load testing, from a handful of races up to millions
+# of results. Rows are generated lazily and written
+# with COPY on Postgres and multi-row inserts elsewhere.
+
+import csv
+from bisect import bisect_right
+from collections import Counter
+from datetime import date, timedelta
+from io import StringIO
+from itertools import accumulate, islice
+from random import Random
+from time import perf_counter
+
+WINNERS = ['uniform', 'zipf']
+SERIES_SIZES = ['even', 'random']
+
+
+class BulkWriter:
+    '''
+    Writes batches of rows to a table inside the session's transaction,
+    using COPY when the db is Postgres.
+    '''
+
+    def __init__(self, db, batchSize=10000):
+        self.db = db
+        self.batchSize = batchSize
+        self.connection = db.session.connection()
+        self.copy = self.connection.dialect.name == 'postgresql'
+
+    def nextId(self, table):
+        return self.connection.execute(
+            f'SELECT COALESCE(MAX(id), 0) + 1 FROM {table};').scalar()
+
+    def write(self, table, columns, rows):
+        '''
+        Args:
+            table (str): Table to write to
+            columns (list(str)): Columns given in each row
+            rows (iterable(tup)): Rows to write, consumed lazily
+
+        Returns:
+            int - number of rows written
+        '''
+        rows = iter(rows)
+        written = 0
+        while True:
+            batch = list(islice(rows, self.batchSize))
+            if not batch:
+                break
+            if self.copy:
+                self.copyBatch(table, columns, batch)
+            else:
+                self.insertBatch(table, columns, batch)
+            written += len(batch)
+        if written and self.copy:
+            # ids were given explicitly, move the serial past them
+            self.connection.execute(f'''
+SELECT
+    setval(pg_get_serial_sequence('{table}', 'id'), MAX(id))
+FROM
+    {table};
+''')
+        return written
+
+    def copyBatch(self, table, columns, batch):
+        buffer = StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        cursor = self.connection.connection.cursor()
+        cursor.copy_expert(
+            f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH CSV',
+            buffer)
+        cursor.close()
+
+    def insertBatch(self, table, columns, batch):
+        self.connection.execute(
+            self.db.metadata.tables[table].insert(),
+            [dict(zip(columns, row)) for row in batch])
+
+
+def splitRaces(random, races, series, sizes):
+    '''
+    Returns:
+        list(int) - index of the first race of each series after the
+        first, so bisect_right gives the series of a race
+    '''
+    if series <= 1:
+        return []
+    if sizes == 'random':
+        return sorted(random.sample(range(1, max(races, series)),
+                                    series - 1))
+    return [races * i // series for i in range(1, series)]
+
+
+def generate(db, racers=20, series=10, races=10000, subscribers=100,
+             videos=10, winners='uniform', skew=1.2, seriesSizes='even',
+             racesPerDay=4, startDate=date(2020, 1, 1), racerNames=(),
+             seriesNames=(), activate=True, seed=0, batchSize=10000,
+             commit=False):
+    '''
+    Add a synthetic dataset on top of whatever is in the db. The same
+    arguments on the same db always produce the same rows.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        racers (int): Number of racers
+        series (int): Number of series the races are split into
+        races (int): Number of races, each with one result
+        subscribers (int): Number of email subscribers
+        videos (int): Number of videos
+        winners (str): uniform, or zipf for a few dominant racers
+        skew (float): Exponent of the zipf distribution
+        seriesSizes (str): even, or random series lengths
+        racesPerDay (int): Races run on each date
+        startDate (date): Date of the first race
+        racerNames (list(str)): Names for the first racers
+        seriesNames (list(str)): Names for the first series
+        activate (bool): Set True to make the last series the active one
+        seed (int): Random seed
+        batchSize (int): Rows per COPY/INSERT
+        commit (bool): Set True to commit changes
+
+    Returns:
+        dict - rows added per table and seconds taken
+    '''
+    from .db_connector import (addStandings, bumpDataVersion, getLastRace,
+                               invalidateIndex, invalidateRegistry,
+                               rebuildStandingHistory)
+    from .extensions import getEmbedded
+
+    if winners not in WINNERS:
+        raise ValueError(f'Unknown winners distribution: {winners}')
+    if seriesSizes not in SERIES_SIZES:
+        raise ValueError(f'Unknown series sizes: {seriesSizes}')
+
+    started = perf_counter()
+    random = Random(seed)
+    writer = BulkWriter(db, batchSize)
+    today = date.today()
+    added = {}
+
+    firstRacer = writer.nextId('racer')
+    racerIds = list(range(firstRacer, firstRacer + racers))
+    names = list(racerNames) + [f'Racer {id:05d}' for id in racerIds]
+    added['racers'] = writer.write(
+        'racer', ['id', 'name', 'height', 'weight', 'color', 'is_active'],
+        ((id, name.title(), random.randint(12, 20), random.randint(30, 50),
+          f'rgb({random.randint(0, 255)}, {random.randint(0, 255)}, '
+          f'{random.randint(0, 255)})', True)
+         for id, name in zip(racerIds, names)))
+
+    firstSeries = writer.nextId('series')
+    seriesIds = list(range(firstSeries, firstSeries + series))
+    cups = list(seriesNames) + [f'Generated Cup {id:04d}'
+                                for id in seriesIds]
+    if activate and seriesIds:
+        writer.connection.execute(
+            "UPDATE series SET is_active=false WHERE is_active;")
+    added['series'] = writer.write(
+        'series', ['id', 'name', 'winner_id', 'is_active', 'created_date'],
+        ((id, cup.title(), None, activate and id == seriesIds[-1], today)
+         for id, cup in zip(seriesIds, cups)))
+
+    if winners == 'zipf':
+        weights = [1 / rank ** skew for rank in range(1, racers + 1)]
+    else:
+        weights = [1] * racers
+    cumulative = list(accumulate(weights))
+    if racers and seriesIds:
+        boundaries = splitRaces(random, races, series, seriesSizes)
+    else:
+        races = 0
+    firstRace = writer.nextId('race')
+    firstNumber = getLastRace() + 1
+
+    def raceRows():
+        for i in range(races):
+            yield (firstRace + i, firstNumber + i,
+                   startDate + timedelta(days=i // racesPerDay),
+                   seriesIds[bisect_right(boundaries, i)])
+
+    added['races'] = writer.write('race',
+                                  ['id', 'number', 'date', 'series_id'],
+                                  raceRows())
+
+    wins = Counter()
+    firstResult = writer.nextId('result')
+
+    def resultRows():
+        for i in range(races):
+            racer_id = random.choices(racerIds, cum_weights=cumulative)[0]
+            series_id = seriesIds[bisect_right(boundaries, i)]
+            wins[(series_id, racer_id)] += 1
+            yield firstResult + i, firstRace + i, racer_id, series_id
+
+    added['results'] = writer.write(
+        'result', ['id', 'race_id', 'racer_id', 'series_id'], resultRows())
+
+    items = list(wins.items())
+    for start in range(0, len(items), 1000):
+        addStandings(db, dict(items[start:start + 1000]))
+    if races:
+        rebuildStandingHistory(db, series=seriesIds)
+
+    firstEmail = writer.nextId('email')
+    added['subscribers'] = writer.write(
+        'email', ['id', 'first', 'last', 'address', 'is_active'],
+        ((id, f'Fan{id}', 'Generated', f'fan{id}@example.com', True)
+         for id in range(firstEmail, firstEmail + subscribers)))
+
+    firstVideo = writer.nextId('video')
+
+    def videoRows():
+        for id in range(firstVideo, firstVideo + videos):
+            url = f'https://youtu.be/generated{id:05d}'
+            yield (id, f'Group {id % 4}', f'Video {id:05d}',
+                   'Generated video', url, getEmbedded(url), True, False)
+
+    added['videos'] = writer.write(
+        'video', ['id', 'groupname', 'name', 'description', 'url',
+                  'url_embedded', 'include_media', 'is_active'],
+        videoRows())
+
+    bumpDataVersion('racer', 'race', 'series', 'result', 'standing', 'email',
+                    'video')
+    if commit:
+        db.session.commit()
+    invalidateIndex()
+    invalidateRegistry('racers', 'series', 'videos')
+
+    added['seconds'] = round(perf_counter() - started, 2)
+    return added
@@ -7,6 +7,144 @@
 # to the db
 
 
+def invalidateIndex():
+    '''
+    Drop the cached index page payload so the next visitor rebuilds it.
+    Called by every helper that changes the standings chart or the
+    active video.
+    '''
+    from .cache import INDEX_KEY, cache
+    cache.delete(INDEX_KEY)
+
+
+def invalidateRegistry(*tables):
+    '''
+    Drop this request's reference rows so forms and routes reload them
+    (cached copies are keyed on the table version, which the write bumps).
+    Called by every helper that adds, changes or deletes racers, series or
+    videos.
+
+    Args:
+        tables (str): racers, series and/or videos
+    '''
+    from .registry import registry
+    registry.invalidate(*tables)
+
+
+def bumpDataVersion(*tables):
+    '''
+    Mark the current transaction as changing the given tables, so cached
+    table fragments (and, for racers, races, series, results, standings
+    or videos, the public pages' ETags) change when it commits. Called by
+    every helper that writes one of them; the outbox is never shown.
+
+    Args:
+        tables (str): Names of the tables written
+    '''
+    from .conditional import conditional
+    conditional.bump(*tables)
+
+
+def publishStandings(event, data=None):
+    '''
+    Tell the viewers of the live standings chart about a change. The
+    event is only sent if the current transaction commits.
+
+    Args:
+        event (str): wins, winner or refresh (resend the whole chart)
+        data (dict): Event data
+    '''
+    from .broadcast import broadcaster
+    broadcaster.publish(event, data or {})
+
+
+def publishWins(series_id, racer_id, wins):
+    '''
+    Publish a racer's new win total in a series.
+
+    Args:
+        series_id (int): Series id
+        racer_id (int): Racer id
+        wins (int): The racer's wins in the series, as returned by
+            updateStanding
+    '''
+    from .models import Racer
+    racer = Racer.query.get(racer_id)
+    publishStandings('wins', {
+        'series': series_id,
+        'racer': racer.name,
+        'color': racer.color,
+        'active': racer.is_active,
+        'wins': wins,
+    })
+
+
+def upsertRows(db, model, columns, rows, conflict):
+    '''
+    Insert rows into the model's table with a single
+    INSERT ... ON CONFLICT ... RETURNING statement. Rows that clash with
+    an existing row on the conflict columns are left untouched and the
+    existing row is returned instead, so a presence check, insert and
+    re-read cost one round trip.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        model (db.Model): Model whose table to insert into
+        columns (list(str)): Columns given in each row
+        rows (list(tup)): Values in the same order as columns
+        conflict (list(str)): Columns of the unique constraint to match
+
+    Returns:
+        list(model) - one object per distinct row, in no particular order
+    '''
+    from sqlalchemy import text, tuple_
+
+    # postgres refuses to touch the same row twice in one statement
+    distinct = {}
+    for row in rows:
+        values = dict(zip(columns, row))
+        distinct.setdefault(tuple(values[column] for column in conflict),
+                            values)
+    if not distinct:
+        return []
+
+    params = {}
+    placeholders = []
+    for i, values in enumerate(distinct.values()):
+        for column, value in values.items():
+            params[f'{column}_{i}'] = value
+        placeholders.append(
+            '(' + ', '.join(f':{column}_{i}' for column in columns) + ')')
+
+    insert = f'''
+INSERT INTO
+    {model.__tablename__} ({', '.join(columns)})
+VALUES
+    {', '.join(placeholders)}
+ON CONFLICT
+    ({', '.join(conflict)})
+'''
+    if db.engine.dialect.name != 'postgresql':
+        # sqlite before 3.35 has no RETURNING, so insert what is missing
+        # and read every row back in a second statement
+        db.session.flush()
+        db.session.execute(text(insert + 'DO NOTHING;'), params)
+        keys = [getattr(model, column) for column in conflict]
+        if len(keys) == 1:
+            match = keys[0].in_([key for key, in distinct])
+        else:
+            match = tuple_(*keys).in_(list(distinct))
+        return model.query.filter(match).all()
+
+    statement = text(insert + f'''
+DO UPDATE SET
+    {conflict[0]}=EXCLUDED.{conflict[0]}
+RETURNING
+    *;
+''')
+    return model.query.from_statement(statement).params(**params).all()
+
+
 def getRacer(name=False, id=False, active=False, all=False):
     '''
     Return a Racer object from the db if it exists
@@ -51,15 +189,37 @@ def addRacer(db, name, height, weight, color,
     Returns:
         Racer
     '''
+    return addRacers(db, [(name, height, weight, color, is_active)],
+                     commit=commit)[0]
+
+
+def addRacers(db, racers, commit=False):
+    '''
+    Add many Racer objects to the db in one statement, skipping names
+    that already exist.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        racers (list(tup)): (name, height, weight, color, is_active)
+        commit (bool): Set True to commit changes
+
+    Returns:
+        list(Racer) - new and existing racers
+    '''
     from .models import Racer
-    present = getRacer(name=name)
-    if not present:
-        racer = Racer(name, height, weight, color, is_active)
-        db.session.add(racer)
-        if commit:
-            db.session.commit()
+    rows = [(name.title(), height, weight, color, is_active)
+            for name, height, weight, color, is_active in racers]
+    racers = upsertRows(db, Racer,
+                        ['name', 'height', 'weight', 'color', 'is_active'],
+                        rows, ['name'])
+    bumpDataVersion('racer')
+    if commit:
+        db.session.commit()
+    if racers:
+        invalidateIndex()
+        invalidateRegistry('racers')
 
-    return getRacer(name=name)
+    return racers
 
 
 def deleteRacer(db, racer, commit=False):
@@ -71,8 +231,10 @@ def deleteRacer(db, racer, commit=False):
         racer (Racer): Racer to delete from the db
     '''
     db.session.delete(racer)
+    bumpDataVersion('racer')
     if commit:
         db.session.commit()
+    invalidateRegistry('racers')
 
 
 def getRace(number=False, id=False, all=False):
@@ -98,31 +260,114 @@ def getRace(number=False, id=False, all=False):
 
 def addRace(db, number, date, cup, commit=False):
     '''
-    Add a Race object to the db if it doesn't exist.
+    Add a Race object to the db if it doesn't exist, creating its Series
+    as well if needed.
 
     Args:
         db (SQLAlchemy): Flask sqlalchemy object
         number (String): Race number
         date (datetime): Race date
-        cup (string): id of the Cup the race belongs to
+        cup (string): Name of the Cup the race belongs to
         commit (bool): Set True to commit changes
     Returns:
         Race
     '''
+    return addRaces(db, [(number, date, cup)], commit=commit)[0]
+
+
+def addRaces(db, races, commit=False):
+    '''
+    Add many Race objects to the db in one statement. Missing series are
+    created by the same statement, and race numbers that already exist
+    are returned unchanged.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        races (list(tup)): (number, date, cup name)
+        commit (bool): Set True to commit changes
+
+    Returns:
+        list(Race) - new and existing races, in no particular order
+    '''
     from .models import Race
-    present = getRace(number=number)
-    if not present:
-        seriesPresent = getSeries(name=cup)
-        if not seriesPresent:
-            series = addSeries(db, name=cup, commit=commit)
-        else:
-            series = seriesPresent
-        race = Race(number, date, series.id)
-        db.session.add(race)
+    from datetime import date as Date
+    from sqlalchemy import text
+
+    distinct = {}
+    for number, date, cup in races:
+        distinct.setdefault(int(number), (date, cup.title()))
+    if not distinct:
+        return []
+
+    if db.engine.dialect.name != 'postgresql':
+        # no data-modifying CTEs, upsert the series first
+        series = {series.name: series.id for series in addSerieses(
+            db, [(cup, None, False)
+                 for cup in {cup for _, cup in distinct.values()}])}
+        races = upsertRows(db, Race, ['number', 'date', 'series_id'], [
+            (number, date, series[cup])
+            for number, (date, cup) in distinct.items()
+        ], ['number'])
+        bumpDataVersion('race', 'series')
         if commit:
             db.session.commit()
+        invalidateRegistry('series')
+        return races
+
+    params = {'created_date': Date.today()}
+    placeholders = []
+    for i, (number, (date, cup)) in enumerate(distinct.items()):
+        params.update({f'number_{i}': number, f'date_{i}': date,
+                       f'cup_{i}': cup})
+        placeholders.append(f'(CAST(:number_{i} AS INTEGER), '
+                            f'CAST(:date_{i} AS DATE), :cup_{i})')
+
+    statement = text(f'''
+WITH new_race (number, date, cup) AS (
+    VALUES
+        {', '.join(placeholders)}
+), race_series AS (
+    INSERT INTO
+        series (name, is_active, created_date)
+    SELECT DISTINCT
+        cup,
+        false,
+        :created_date
+    FROM
+        new_race
+    ON CONFLICT
+        (name)
+    DO UPDATE SET
+        name=EXCLUDED.name
+    RETURNING
+        id,
+        name
+)
+INSERT INTO
+    race (number, date, series_id)
+SELECT
+    new_race.number,
+    new_race.date,
+    race_series.id
+FROM
+    new_race
+JOIN
+    race_series ON race_series.name=new_race.cup
+ON CONFLICT
+    (number)
+DO UPDATE SET
+    number=EXCLUDED.number
+RETURNING
+    race.*;
+''')
+    races = Race.query.from_statement(statement).params(**params).all()
+    bumpDataVersion('race', 'series')
+    if commit:
+        db.session.commit()
+    # new cups add series
+    invalidateRegistry('series')
 
-    return getRace(number=number)
+    return races
 
 
 def deleteRace(db, race, commit=False):
@@ -134,6 +379,7 @@ def deleteRace(db, race, commit=False):
         race (Race): Race to delete from the db
     '''
     db.session.delete(race)
+    bumpDataVersion('race')
     if commit:
         db.session.commit()
 
@@ -180,15 +426,35 @@ def addSeries(db, name, winner_id=False, is_active=False, commit=False):
     Returns:
         Series
     '''
+    return addSerieses(db, [(name, winner_id, is_active)], commit=commit)[0]
+
+
+def addSerieses(db, serieses, commit=False):
+    '''
+    Add many Series objects to the db in one statement, skipping names
+    that already exist.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        serieses (list(tup)): (name, winner_id, is_active)
+        commit (bool): Set True to commit changes
+
+    Returns:
+        list(Series) - new and existing series
+    '''
     from .models import Series
-    present = getSeries(name=name.title())
-    if not present:
-        series = Series(name, winner_id, is_active)
-        db.session.add(series)
-        if commit:
-            db.session.commit()
+    from datetime import date
+    rows = [(name.title(), winner_id or None, is_active, date.today())
+            for name, winner_id, is_active in serieses]
+    serieses = upsertRows(db, Series,
+                          ['name', 'winner_id', 'is_active', 'created_date'],
+                          rows, ['name'])
+    bumpDataVersion('series')
+    if commit:
+        db.session.commit()
+    invalidateRegistry('series')
 
-    return getSeries(name=name)
+    return serieses
 
 
 def deleteSeries(db, series, commit=False):
@@ -200,8 +466,10 @@ def deleteSeries(db, series, commit=False):
         series (Series): Series to delete from the db
     '''
     db.session.delete(series)
+    bumpDataVersion('series')
     if commit:
         db.session.commit()
+    invalidateRegistry('series')
 
 
 def getResult(id=False, race_id=False, racer_id=False, all=False):
@@ -227,7 +495,9 @@ def getResult(id=False, race_id=False, racer_id=False, all=False):
 
 def addResult(db, race_id, racer_id, series_id, commit=False):
     '''
-    Add a Result object to the db
+    Add a Result object to the db. A result the racer already has for the
+    race (e.g. a resubmitted form) is returned as it is rather than
+    counted twice.
 
     Args:
         db (SQLAlchemy): Flask sqlalchemy object
@@ -238,12 +508,52 @@ def addResult(db, race_id, racer_id, series_id, commit=False):
         Result
     '''
     from .models import Result
+    lockStanding(db, series_id, racer_id)
+    result = Result.query.filter_by(race_id=race_id,
+                                    racer_id=racer_id).first()
+    if result:
+        return result
+
     result = Result(race_id, racer_id, series_id)
     db.session.add(result)
+    publishWins(series_id, racer_id,
+                updateStanding(db, series_id, racer_id, 1))
+    updateStandingHistory(db, series_id, racer_id, race_id, 1)
+    bumpDataVersion('result')
     if commit:
         db.session.commit()
+    invalidateIndex()
+
+    return result
+
 
-    return getResult(race_id=race_id)
+def addResults(db, results, commit=False):
+    '''
+    Add many Result objects to the db with one multi-row INSERT. Unlike
+    addResult, standings are left to the caller (see addStandings).
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        results (list(tup)): (race_id, racer_id, series_id)
+        commit (bool): Set True to commit changes
+
+    Returns:
+        int - number of results added
+    '''
+    from .models import Result
+    if results:
+        db.session.execute(Result.__table__.insert().values([
+            {'race_id': race_id, 'racer_id': racer_id,
+             'series_id': series_id}
+            for race_id, racer_id, series_id in results
+        ]))
+    bumpDataVersion('result')
+    if commit:
+        db.session.commit()
+    if results:
+        invalidateIndex()
+
+    return len(results)
 
 
 def deleteResult(db, result, commit=False):
@@ -254,9 +564,368 @@ def deleteResult(db, result, commit=False):
         db (SQLAlchemy): Flask sqlalchemy object
         result (Result): Result to delete from the db
     '''
+    lockStanding(db, result.series_id, result.racer_id)
     db.session.delete(result)
+    publishWins(result.series_id, result.racer_id,
+                updateStanding(db, result.series_id, result.racer_id, -1))
+    updateStandingHistory(db, result.series_id, result.racer_id,
+                          result.race_id, -1)
+    bumpDataVersion('result')
     if commit:
         db.session.commit()
+    invalidateIndex()
+
+
+def lockStanding(db, series_id, racer_id):
+    '''
+    Lock a racer's standing in a series until the transaction ends, so
+    concurrent results for the same racer and series are counted one
+    after the other. Each statement after the lock sees what the others
+    committed. A no-op on sqlite, which only runs one writer at a time.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        series_id (int): Series id
+        racer_id (int): Racer id
+    '''
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute('''
+SELECT
+    pg_advisory_xact_lock(:series_id, :racer_id);
+''', {'series_id': series_id, 'racer_id': racer_id})
+
+
+def updateStanding(db, series_id, racer_id, wins, commit=False):
+    '''
+    Adjust the pre-aggregated win count of a racer in a series. Called
+    by addResult/deleteResult so the standing is written in the same
+    transaction as the result itself. The count is changed in the db with
+    one upsert, so concurrent results for the same racer never lose a
+    win or clash creating the standing.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        series_id (int): Series id
+        racer_id (int): Racer id
+        wins (int): Number of wins to add (negative to subtract)
+        commit (bool): Set True to commit changes
+
+    Returns:
+        int - the racer's wins in the series after the change
+    '''
+    params = {'series_id': series_id, 'racer_id': racer_id, 'wins': wins}
+    upsert = '''
+INSERT INTO
+    standing (series_id, racer_id, wins)
+VALUES
+    (:series_id, :racer_id, :wins)
+ON CONFLICT
+    (series_id, racer_id)
+DO UPDATE SET
+    wins=standing.wins + EXCLUDED.wins
+'''
+    if db.engine.dialect.name == 'postgresql':
+        total = db.session.execute(upsert + '''
+RETURNING
+    wins;
+''', params).scalar()
+    else:
+        # sqlite before 3.35 has no RETURNING, and only one writer runs
+        # at a time, so read the count back
+        db.session.execute(upsert + ';', params)
+        total = db.session.execute('''
+SELECT
+    wins
+FROM
+    standing
+WHERE
+    series_id=:series_id
+    AND racer_id=:racer_id;
+''', params).scalar()
+    bumpDataVersion('standing')
+    if commit:
+        db.session.commit()
+
+    return total
+
+
+def addStandings(db, wins, commit=False):
+    '''
+    Add win counts to many standings with one statement, creating the
+    standings that don't exist yet.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        wins (dict((int, int): int)): Wins to add by (series_id, racer_id)
+        commit (bool): Set True to commit changes
+    '''
+    from sqlalchemy import text
+    if wins:
+        params = {}
+        placeholders = []
+        for i, ((series_id, racer_id), count) in enumerate(wins.items()):
+            params.update({f'series_id_{i}': series_id,
+                           f'racer_id_{i}': racer_id,
+                           f'wins_{i}': count})
+            placeholders.append(f'(:series_id_{i}, :racer_id_{i}, :wins_{i})')
+        db.session.execute(text(f'''
+INSERT INTO
+    standing (series_id, racer_id, wins)
+VALUES
+    {', '.join(placeholders)}
+ON CONFLICT
+    (series_id, racer_id)
+DO UPDATE SET
+    wins=standing.wins + EXCLUDED.wins;
+'''), params)
+        publishStandings('refresh')
+    bumpDataVersion('standing')
+    if commit:
+        db.session.commit()
+
+
+def rebuildStandings(db, commit=False):
+    '''
+    Rebuild the standing table from scratch by re-aggregating the
+    result table. Only needed after a bulk change to results made
+    outside of addResult/deleteResult (or to populate a fresh table).
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        commit (bool): Set True to commit changes
+    '''
+    db.session.flush()
+    db.session.execute('''
+DELETE FROM
+    standing;
+''')
+    db.session.execute('''
+INSERT INTO
+    standing (series_id, racer_id, wins)
+SELECT
+    result.series_id,
+    result.racer_id,
+    COUNT(*)
+FROM
+    result
+GROUP BY
+    result.series_id,
+    result.racer_id;
+''')
+    publishStandings('refresh')
+    bumpDataVersion('standing')
+    if commit:
+        db.session.commit()
+
+
+def updateStandingHistory(db, series_id, racer_id, race_id, wins,
+                          commit=False):
+    '''
+    Add (or remove) a racer's win in one race to the cumulative wins
+    history of a series. Called by addResult/deleteResult next to
+    updateStanding. Results are usually added in race order, in which
+    case only the new row is written; an earlier race also shifts the
+    racer's later rows. Runs under lockStanding, as the new row is
+    counted from the racer's earlier ones.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        series_id (int): Series id
+        racer_id (int): Racer id
+        race_id (int): Id of the race won
+        wins (int): 1 to add the win, -1 to remove it
+        commit (bool): Set True to commit changes
+    '''
+    params = {'series_id': series_id, 'racer_id': racer_id,
+              'race_id': race_id, 'wins': wins}
+    lockStanding(db, series_id, racer_id)
+    if wins < 0:
+        # the deleted result must be gone for the check below
+        db.session.flush()
+        db.session.execute('''
+UPDATE
+    standing_history
+SET
+    wins=wins + :wins
+WHERE
+    series_id=:series_id
+    AND racer_id=:racer_id
+    AND race_number >= (SELECT number FROM race WHERE id=:race_id);
+''', params)
+        # keep the race's row if the racer has another result for it
+        db.session.execute('''
+DELETE FROM
+    standing_history
+WHERE
+    series_id=:series_id
+    AND racer_id=:racer_id
+    AND race_number=(SELECT number FROM race WHERE id=:race_id)
+    AND NOT EXISTS (
+        SELECT
+            1
+        FROM
+            result
+        WHERE
+            race_id=:race_id
+            AND racer_id=:racer_id
+    );
+''', params)
+    else:
+        db.session.execute('''
+UPDATE
+    standing_history
+SET
+    wins=wins + :wins
+WHERE
+    series_id=:series_id
+    AND racer_id=:racer_id
+    AND race_number > (SELECT number FROM race WHERE id=:race_id);
+''', params)
+        db.session.execute('''
+INSERT INTO
+    standing_history (series_id, racer_id, race_number, wins)
+SELECT
+    :series_id,
+    :racer_id,
+    race.number,
+    1 + COALESCE((
+        SELECT
+            wins
+        FROM
+            standing_history
+        WHERE
+            series_id=:series_id
+            AND racer_id=:racer_id
+            AND race_number < race.number
+        ORDER BY
+            race_number DESC
+        LIMIT 1
+    ), 0)
+FROM
+    race
+WHERE
+    race.id=:race_id
+ON CONFLICT
+    (series_id, racer_id, race_number)
+DO UPDATE SET
+    wins=standing_history.wins + 1;
+''', params)
+    bumpDataVersion('standing_history')
+    if commit:
+        db.session.commit()
+
+
+def rebuildStandingHistory(db, series=False, commit=False):
+    '''
+    Rebuild the cumulative wins history from the result table, for the
+    given series or for every series. Used to backfill historical series
+    and after bulk imports, which skip updateStandingHistory.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        series (list(int)): Ids of the series to rebuild (defaults to all)
+        commit (bool): Set True to commit changes
+
+    Returns:
+        int - number of history rows written
+    '''
+    from sqlalchemy import bindparam, text
+
+    where = ''
+    params = {}
+    if series:
+        where = 'WHERE series_id IN :series'
+        params['series'] = list(series)
+
+    def statement(sql):
+        sql = text(sql)
+        if series:
+            sql = sql.bindparams(bindparam('series', expanding=True))
+        return sql
+
+    db.session.flush()
+    db.session.execute(statement(f'''
+DELETE FROM
+    standing_history
+{where};
+'''), params)
+    written = db.session.execute(statement(f'''
+INSERT INTO
+    standing_history (series_id, racer_id, race_number, wins)
+SELECT
+    result.series_id,
+    result.racer_id,
+    race.number,
+    SUM(COUNT(*)) OVER (
+        PARTITION BY
+            result.series_id,
+            result.racer_id
+        ORDER BY
+            race.number
+    )
+FROM
+    result
+JOIN
+    race ON race.id=result.race_id
+{where.replace('series_id', 'result.series_id')}
+GROUP BY
+    result.series_id,
+    result.racer_id,
+    race.number;
+'''), params).rowcount
+    bumpDataVersion('standing_history')
+    if commit:
+        db.session.commit()
+
+    return written
+
+
+def getStandingHistory(db, series_id):
+    '''
+    Return the cumulative wins history of every active racer in a series,
+    ordered by racer then race number.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        series_id (int): Series id
+
+    Returns:
+        ResultProxy - rows of (name, color, race_number, wins)
+    '''
+    return db.session.execute('''
+SELECT
+    racer.name AS name,
+    racer.color AS color,
+    standing_history.race_number AS race_number,
+    standing_history.wins AS wins
+FROM
+    standing_history
+JOIN
+    racer ON racer.id=standing_history.racer_id
+WHERE
+    standing_history.series_id=:series_id
+    AND racer.is_active
+ORDER BY
+    racer.name,
+    standing_history.race_number;
+''', {'series_id': series_id})
+
+
+def getSeriesRaceRange(db, series_id):
+    '''
+    Returns:
+        tup - first and last race number of a series (None, None when it
+        has no races)
+    '''
+    return tuple(db.session.execute('''
+SELECT
+    MIN(number),
+    MAX(number)
+FROM
+    race
+WHERE
+    series_id=:series_id;
+''', {'series_id': series_id}).first())
 
 
 def getAdmin(username=False, name=False, all=False):
@@ -286,6 +955,51 @@ def getAdmin(username=False, name=False, all=False):
     return admin
 
 
+def loadAdmin(db, id):
+    '''
+    Get an Admin by id for flask_login's user loader. The admin's
+    identity (without the password) is kept in the application cache for
+    ADMIN_CACHE_TTL seconds, so signed in requests don't need a query to
+    find out who is signed in.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        id (str): Admin id stored in the session
+
+    Returns:
+        Admin - or None if there's no such admin
+    '''
+    from flask import current_app
+
+    from .cache import ADMIN_KEY, cache
+    from .models import Admin
+    from .registry import restore, snapshot
+
+    key = ADMIN_KEY.format(id)
+    identity = cache.get(key)
+    if identity is None:
+        admin = Admin.query.get(int(id))
+        if admin is not None:
+            cache.set(key, snapshot(admin, exclude=['password']),
+                      current_app.config['ADMIN_CACHE_TTL'])
+        return admin
+
+    # the password is left unloaded so it's only queried if read
+    return restore(db, Admin, identity)
+
+
+def invalidateAdmin(admin):
+    '''
+    Drop an admin's cached identity. Called whenever an admin is added or
+    deleted.
+
+    Args:
+        admin (Admin): Admin whose identity changed
+    '''
+    from .cache import ADMIN_KEY, cache
+    cache.delete(ADMIN_KEY.format(admin.id))
+
+
 def addAdmin(db, username, password, name=False,
              encrypted=False, commit=False):
     '''
@@ -312,7 +1026,10 @@ def addAdmin(db, username, password, name=False,
     if not present:
         admin = Admin(username, password, name=name)
         db.session.add(admin)
+        db.session.flush()
+        invalidateAdmin(admin)
 
+        bumpDataVersion('admin')
         if commit:
             db.session.commit()
     else:
@@ -329,7 +1046,9 @@ def deleteAdmin(db, admin, commit=False):
         db (SQLAlchemy): Flask sqlalchemy object
         admin (Admin): Admin to delete from the db
     '''
+    invalidateAdmin(admin)
     db.session.delete(admin)
+    bumpDataVersion('admin')
     if commit:
         db.session.commit()
 
@@ -372,16 +1091,32 @@ def addEmail(db, first, address, last=False, commit=False):
     Returns:
         Email
     '''
-    from .models import Email
+    return addEmails(db, [(first, address, last)], commit=commit)[0]
 
-    present = getEmail(address=address)
-    if not present:
-        email = Email(first, address, last)
-        db.session.add(email)
-        if commit:
-            db.session.commit()
 
-    return getEmail(address=address)
+def addEmails(db, emails, commit=False):
+    '''
+    Adds many emails to the database in one statement, skipping
+    addresses that are already signed up.
+
+    Args:
+        db (SQLAlchemy): db object
+        emails (list(tup)): (first, address, last)
+        commit (bool): Set True to auto-commit
+    Returns:
+        list(Email) - new and existing emails
+    '''
+    from .models import Email
+    rows = [(first.title(), address, last.title() if last else None, False)
+            for first, address, last in emails]
+    emails = upsertRows(db, Email,
+                        ['first', 'address', 'last', 'is_active'],
+                        rows, ['address'])
+    bumpDataVersion('email')
+    if commit:
+        db.session.commit()
+
+    return emails
 
 
 def deleteEmail(db, email, commit=False):
@@ -393,6 +1128,7 @@ def deleteEmail(db, email, commit=False):
         email (Email): Email to delete from the db
     '''
     db.session.delete(email)
+    bumpDataVersion('email')
     if commit:
         db.session.commit()
 
@@ -436,7 +1172,7 @@ def getVideo(id=False, groupAndName=False, url=False, active=False,
 def addVideo(db, groupname, name, description, url,
              include_media, is_active, commit=False):
     '''
-    Adds an email to the database
+    Adds a video to the database
 
     Args:
         db (SQLAlchemy): db object
@@ -448,19 +1184,41 @@ def addVideo(db, groupname, name, description, url,
         is_active (bool): Set True to make this video appear on homepage
         commit (bool): Set True to auto-commit
     Returns:
-        Email
+        Video
     '''
-    from .models import Video
+    return addVideos(db, [(groupname, name, description, url,
+                           include_media, is_active)], commit=commit)[0]
 
-    present = getVideo(groupAndName=(groupname, name))
-    if not present:
-        video = Video(groupname, name, description, url,
-                      include_media, is_active)
-        db.session.add(video)
-        if commit:
-            db.session.commit()
 
-    return getVideo(groupAndName=(groupname, name))
+def addVideos(db, videos, commit=False):
+    '''
+    Adds many videos to the database in one statement, skipping
+    group/name pairs that already exist.
+
+    Args:
+        db (SQLAlchemy): db object
+        videos (list(tup)): (groupname, name, description, url,
+            include_media, is_active)
+        commit (bool): Set True to auto-commit
+    Returns:
+        list(Video) - new and existing videos
+    '''
+    from .models import Video
+    from .extensions import getEmbedded
+    rows = [(groupname, name, description, url, getEmbedded(url),
+             include_media, is_active)
+            for groupname, name, description, url, include_media, is_active
+            in videos]
+    videos = upsertRows(db, Video,
+                        ['groupname', 'name', 'description', 'url',
+                         'url_embedded', 'include_media', 'is_active'],
+                        rows, ['groupname', 'name'])
+    bumpDataVersion('video')
+    if commit:
+        db.session.commit()
+    invalidateRegistry('videos')
+
+    return videos
 
 
 def deleteVideo(db, video, commit=False):
@@ -472,36 +1230,281 @@ def deleteVideo(db, video, commit=False):
         video (Video): Video to delete from the db
     '''
     db.session.delete(video)
+    bumpDataVersion('video')
+    if commit:
+        db.session.commit()
+    invalidateIndex()
+    invalidateRegistry('videos')
+
+
+def addOutbox(db, recipient, subject, content, commit=False):
+    '''
+    Queue an email to be sent by the outbox worker (worker.py). Nothing
+    is sent until the surrounding transaction commits.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        recipient (str): Address to send to
+        subject (str): Subject of the Email
+        content (str): Content of the Email
+        commit (bool): Set True to commit changes
+
+    Returns:
+        Outbox
+    '''
+    from .models import Outbox
+
+    message = Outbox(recipient, subject, content)
+    db.session.add(message)
+    if commit:
+        db.session.commit()
+
+    return message
+
+
+def addOutboxBulk(db, messages, commit=False):
+    '''
+    Queue many emails at once (used for mass mailings).
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        messages (list(tup(str, str, str))): recipient, subject, content
+        commit (bool): Set True to commit changes
+    '''
+    from .models import Outbox
+
+    db.session.bulk_save_objects([
+        Outbox(recipient, subject, content)
+        for recipient, subject, content in messages
+    ])
+    if commit:
+        db.session.commit()
+
+
+def claimOutbox(db, limit, lease, commit=False):
+    '''
+    Claim a batch of emails that are due to be sent. Rows locked by
+    another worker are skipped rather than waited on, so any number of
+    workers can drain the outbox side by side. Claimed emails are marked
+    sending, with the attempt counted, until lease seconds from now; the
+    caller commits the claim before sending anything, so no lock is held
+    while talking to the mail server. The emails are returned as plain
+    tuples, which outlive that commit without being loaded again.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        limit (int): Maximum number of emails to claim
+        lease (int): Seconds the claim lasts (see expireOutboxLeases)
+        commit (bool): Set True to commit changes
+
+    Returns:
+        list(tup) - (id, recipient, subject, content, attempts) of each
+        claimed email
+    '''
+    from datetime import datetime, timedelta
+    from .models import Outbox
+
+    now = datetime.utcnow()
+    batch = Outbox.query.filter(
+        Outbox.status == 'pending',
+        Outbox.next_attempt <= now
+    ).order_by(
+        Outbox.id.asc()
+    ).limit(limit).with_for_update(skip_locked=True).all()
+    claimed = []
+    for message in batch:
+        message.status = 'sending'
+        message.attempts += 1
+        # while sending, next_attempt is when the claim runs out
+        message.next_attempt = now + timedelta(seconds=lease)
+        claimed.append((message.id, message.recipient, message.subject,
+                        message.content, message.attempts))
+    if commit:
+        db.session.commit()
+
+    return claimed
+
+
+def expireOutboxLeases(db, maxAttempts, commit=False):
+    '''
+    Return emails whose claim ran out (their worker died or hung while
+    sending them) to the outbox, or give up on them once maxAttempts is
+    reached. An email that was sent just before its worker died is sent
+    again, but only that one email.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        maxAttempts (int): Attempts before the email is marked failed
+        commit (bool): Set True to commit changes
+
+    Returns:
+        int - number of emails expired
+    '''
+    from datetime import datetime
+
+    expired = db.session.execute('''
+UPDATE
+    outbox
+SET
+    status=CASE WHEN attempts >= :max_attempts
+        THEN 'failed' ELSE 'pending' END,
+    last_error='Claim expired while sending'
+WHERE
+    status='sending'
+    AND next_attempt <= :now;
+''', {'max_attempts': maxAttempts, 'now': datetime.utcnow()}).rowcount
+    if commit:
+        db.session.commit()
+
+    return expired
+
+
+def markOutboxSent(db, id, commit=False):
+    '''
+    Record that a claimed email was sent.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        id (int): Id of the email that was sent
+        commit (bool): Set True to commit changes
+    '''
+    from datetime import datetime
+
+    db.session.execute('''
+UPDATE
+    outbox
+SET
+    status='sent',
+    sent_date=:now,
+    last_error=NULL
+WHERE
+    id=:id;
+''', {'id': id, 'now': datetime.utcnow()})
     if commit:
         db.session.commit()
 
 
+def markOutboxFailed(db, id, attempts, error, maxAttempts, backoff,
+                     commit=False):
+    '''
+    Record a failed attempt, scheduling a retry with exponential backoff
+    or giving up once maxAttempts is reached. The attempt was already
+    counted by claimOutbox.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        id (int): Id of the email that could not be sent
+        attempts (int): Attempts so far, as returned by claimOutbox
+        error (Exception): Why it failed
+        maxAttempts (int): Attempts before the email is marked failed
+        backoff (int): Seconds to wait before the first retry
+        commit (bool): Set True to commit changes
+    '''
+    from datetime import datetime, timedelta
+
+    params = {'id': id, 'error': str(error), 'status': 'failed',
+              'next_attempt': None}
+    if attempts < maxAttempts:
+        delay = backoff * 2 ** (attempts - 1)
+        params.update({'status': 'pending', 'next_attempt':
+                       datetime.utcnow() + timedelta(seconds=delay)})
+    db.session.execute('''
+UPDATE
+    outbox
+SET
+    status=:status,
+    last_error=:error,
+    next_attempt=COALESCE(:next_attempt, next_attempt)
+WHERE
+    id=:id;
+''', params)
+    if commit:
+        db.session.commit()
+
+
+def countOutbox(db):
+    '''
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+
+    Returns:
+        dict(str: int) - number of outbox emails by status
+    '''
+    rows = db.session.execute('''
+SELECT
+    status,
+    COUNT(*) AS emails
+FROM
+    outbox
+GROUP BY
+    status;
+''')
+    return {row.status: row.emails for row in rows}
+
+
 def getTotalWins(db, activeSeries):
-    results = db.session.execute(f'''
+    '''
+    Return the win totals of every active racer in the given series,
+    read from the pre-aggregated standing table.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        activeSeries (Series): Series to get the standings of
+
+    Returns:
+        ResultProxy - rows of (name, color, wins)
+    '''
+    results = db.session.execute('''
 SELECT
     racer.name as name,
     racer.color as color,
-    SUM(CASE WHEN series.name='{activeSeries.name}' THEN 1 ELSE 0 END) AS wins
+    COALESCE(standing.wins, 0) AS wins
 FROM
     racer
 LEFT JOIN
-    result ON result.racer_id=racer.id
-LEFT JOIN
-    series on result.series_id=series.id
+    standing ON standing.racer_id=racer.id
+    AND standing.series_id=:series_id
 WHERE
-    racer.is_active='t'
-GROUP BY
-    racer.name,
-    racer.color
+    racer.is_active
 ORDER BY
     wins DESC;
-''')
+''', {'series_id': activeSeries.id})
     return results
 
 
-def getUserFriendlyRaces(db):
-    results = db.session.execute('''
+PAGE_SIZE = 25
+
+# Queries behind the paginated data tables. Every query exposes a unique
+# page_key column used as the keyset tie-breaker; `sort` lists the columns
+# a page may be ordered by (the first is the default), `search` the
+# columns matched by the search box and `tables` the tables whose writes
+# change it.
+TABLE_PAGES = {
+    'userFriendlyRacers': {
+        'query': '''
+SELECT
+    racer.id AS page_key,
+    racer.name AS name,
+    racer.height AS height,
+    racer.weight AS weight,
+    COUNT(result.racer_id) AS wins
+FROM
+    racer
+LEFT JOIN
+    result ON result.racer_id=racer.id
+GROUP BY
+    racer.id, racer.name, racer.height, racer.weight
+''',
+        'sort': ['name', 'wins', 'height', 'weight'],
+        'search': ['name'],
+        'tables': ['racer', 'result'],
+    },
+    # one row per result, so a race with more than one result keeps its
+    # rows apart, and a race without one is keyed by its negated id
+    'userFriendlyRaces': {
+        'query': '''
 SELECT
+    COALESCE(result.id, -race.id) AS page_key,
     race.number AS number,
     race.date AS date,
     racer.name AS winner,
@@ -513,57 +1516,401 @@ LEFT JOIN
 LEFT JOIN
     result ON result.race_id=race.id
 LEFT JOIN
-    racer ON result.racer_id=racer.id;
-''')
-    return results
-
-
-def getUserFriendlyRacers(db):
-    results = db.session.execute('''
+    racer ON result.racer_id=racer.id
+''',
+        'sort': ['number', 'date'],
+        'search': ['winner', 'series'],
+        'tables': ['race', 'racer', 'result', 'series'],
+    },
+    'userFriendlySeries': {
+        'query': '''
+SELECT
+    series.id AS page_key,
+    series.id AS id,
+    series.name AS name,
+    racer.name AS winner
+FROM
+    series
+LEFT JOIN
+    racer ON racer.id=series.winner_id
+''',
+        'sort': ['id', 'name'],
+        'order': 'desc',
+        'search': ['name', 'winner'],
+        'tables': ['racer', 'series'],
+    },
+    'admin': {
+        'query': '''
 SELECT
+    admin.id AS page_key,
+    admin.id AS id,
+    admin.username AS username,
+    admin.name AS name,
+    admin.created_date AS created_date
+FROM
+    admin
+''',
+        'sort': ['id', 'username'],
+        'search': ['username', 'name'],
+        'tables': ['admin'],
+    },
+    'email': {
+        'query': '''
+SELECT
+    email.id AS page_key,
+    email.id AS id,
+    email.first AS first,
+    email.last AS last,
+    email.address AS address,
+    email.is_active AS is_active
+FROM
+    email
+''',
+        'sort': ['id', 'address', 'first'],
+        'search': ['first', 'last', 'address'],
+        'tables': ['email'],
+    },
+    'race': {
+        'query': '''
+SELECT
+    race.id AS page_key,
+    race.id AS id,
+    race.number AS number,
+    race.date AS date,
+    race.series_id AS series_id
+FROM
+    race
+''',
+        'sort': ['id', 'number', 'date'],
+        'search': ['number', 'series_id'],
+        'tables': ['race'],
+    },
+    'racer': {
+        'query': '''
+SELECT
+    racer.id AS page_key,
+    racer.id AS id,
     racer.name AS name,
     racer.height AS height,
     racer.weight AS weight,
-    COUNT(result.racer_id) AS wins
+    racer.color AS color,
+    racer.is_active AS is_active
 FROM
     racer
-LEFT JOIN
-    result ON result.racer_id=racer.id
-GROUP BY
-    racer.name, racer.height, racer.weight
-ORDER BY
-    racer.name;
-''')
-    return results
+''',
+        'sort': ['id', 'name'],
+        'search': ['name', 'color'],
+        'tables': ['racer'],
+    },
+    'series': {
+        'query': '''
+SELECT
+    series.id AS page_key,
+    series.id AS id,
+    series.name AS name,
+    series.winner_id AS winner_id,
+    series.is_active AS is_active,
+    series.created_date AS created_date
+FROM
+    series
+''',
+        'sort': ['id', 'name'],
+        'search': ['name'],
+        'tables': ['series'],
+    },
+    'result': {
+        'query': '''
+SELECT
+    result.id AS page_key,
+    result.id AS id,
+    result.race_id AS race_id,
+    result.racer_id AS racer_id,
+    result.series_id AS series_id
+FROM
+    result
+''',
+        'sort': ['id'],
+        'search': ['race_id', 'racer_id', 'series_id'],
+        'tables': ['result'],
+    },
+    'video': {
+        'query': '''
+SELECT
+    video.id AS page_key,
+    video.id AS id,
+    video.groupname AS groupname,
+    video.name AS name,
+    video.description AS description,
+    video.url AS url,
+    video.url_embedded AS url_embedded,
+    video.include_media AS include_media,
+    video.is_active AS is_active
+FROM
+    video
+''',
+        'sort': ['id', 'groupname', 'name'],
+        'search': ['groupname', 'name', 'description'],
+        'tables': ['video'],
+    },
+}
 
 
-def getUserFriendlySeries(db):
-    results = db.session.execute('''
+def encodeCursor(sortValue, key):
+    '''
+    Encode the position of the last row of a page into an opaque string.
+
+    Args:
+        sortValue: Value of the sort column in the last row
+        key (int): page_key of the last row
+
+    Returns:
+        str
+    '''
+    import json
+    from base64 import urlsafe_b64encode
+
+    position = json.dumps([sortValue, key], default=str)
+    return urlsafe_b64encode(position.encode()).decode()
+
+
+def decodeCursor(cursor):
+    '''
+    Decode a cursor made by encodeCursor.
+
+    Args:
+        cursor (str): Cursor to decode
+
+    Returns:
+        tup(sortValue, key)
+
+    Raises:
+        ValueError, TypeError or binascii.Error if the cursor wasn't made
+        by encodeCursor
+    '''
+    import json
+    from base64 import urlsafe_b64decode
+
+    sortValue, key = json.loads(urlsafe_b64decode(cursor.encode()))
+    if (not isinstance(key, int) or isinstance(key, bool)
+            or not isinstance(sortValue, (str, int, float, type(None)))):
+        raise ValueError(f'Malformed cursor: {cursor}')
+    return sortValue, key
+
+
+def getTablePageOptions(table, sort=False, order=False, after=False,
+                        search=False):
+    '''
+    Fill in the defaults of a data table page request without running
+    its query.
+
+    Args:
+        table (str): Key of TABLE_PAGES to page through
+        sort (str): Column to sort by (defaults to the table's first)
+        order (str): 'asc' or 'desc'
+        after (str): Cursor returned as `next` by the previous page
+        search (str): Only return rows where a search column contains this
+
+    Returns:
+        dict - table, sort, order, after and search, as taken by
+        getTablePage()
+
+    Aborts with 400 if after isn't a cursor made by encodeCursor.
+    '''
+    from binascii import Error as Base64Error
+    from flask import abort
+
+    spec = TABLE_PAGES[table]
+    if sort not in spec['sort']:
+        sort = spec['sort'][0]
+    if order not in ('asc', 'desc'):
+        order = spec.get('order', 'asc')
+    if after:
+        try:
+            decodeCursor(after)
+        except (ValueError, TypeError, Base64Error):
+            abort(400)
+    return {
+        'table': table,
+        'sort': sort,
+        'order': order,
+        'after': after or '',
+        'search': search or '',
+    }
+
+
+def getTablePage(db, table, sort=False, order=False, after=False,
+                 search=False, limit=PAGE_SIZE):
+    '''
+    Return one page of a data table using keyset pagination, so the
+    cost of a page doesn't depend on how deep into the table it is.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        table (str): Key of TABLE_PAGES to page through
+        sort (str): Column to sort by (defaults to the table's first)
+        order (str): 'asc' or 'desc'
+        after (str): Cursor returned as `next` by the previous page
+        search (str): Only return rows where a search column contains this
+        limit (int): Number of rows per page
+
+    Returns:
+        dict - rows, next (cursor or None), sort, order and search
+
+    Aborts with 400 if after doesn't match the sort column's type.
+    '''
+    from flask import abort
+    from sqlalchemy.exc import DataError
+
+    spec = TABLE_PAGES[table]
+    options = getTablePageOptions(table, sort, order)
+    sort, order = options['sort'], options['order']
+    comparison = '>' if order == 'asc' else '<'
+
+    conditions = []
+    params = {'limit': limit + 1}
+    if search:
+        conditions.append('(' + ' OR '.join(
+            f'LOWER(CAST(page.{column} AS VARCHAR)) LIKE :search'
+            for column in spec['search']) + ')')
+        params['search'] = f'%{search.lower()}%'
+    if after:
+        params['after_sort'], params['after_key'] = decodeCursor(after)
+        conditions.append(f'''(
+    page.{sort} {comparison} :after_sort
+    OR (page.{sort} = :after_sort
+        AND page.page_key {comparison} :after_key)
+)''')
+    where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+
+    try:
+        rows = db.session.execute(f'''
 SELECT
-    series.name AS name,
+    *
+FROM
+    ({spec['query']}) AS page
+{where}
+ORDER BY
+    page.{sort} {order},
+    page.page_key {order}
+LIMIT :limit;
+''', params).fetchall()
+    except DataError:
+        if not after:
+            raise
+        # a cursor taken from a column of another type
+        db.session.rollback()
+        abort(400)
+
+    next = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next = encodeCursor(rows[-1][sort], rows[-1].page_key)
+
+    return {
+        'rows': rows,
+        'next': next,
+        'sort': sort,
+        'order': order,
+        'search': search or '',
+    }
+
+
+EXPORTS = {
+    'races': '''
+SELECT
+    race.number AS number,
+    race.date AS date,
+    series.name AS series,
     racer.name AS winner
 FROM
-    series
+    race
 LEFT JOIN
-    racer ON racer.id=series.winner_id
+    series ON race.series_id=series.id
+LEFT JOIN
+    result ON result.race_id=race.id
+LEFT JOIN
+    racer ON result.racer_id=racer.id
 ORDER BY
-    series.id DESC;
-''')
-    return results
+    race.number
+''',
+    'results': '''
+SELECT
+    result.id AS id,
+    race.number AS race_number,
+    race.date AS date,
+    series.name AS series,
+    racer.name AS racer
+FROM
+    result
+JOIN
+    race ON race.id=result.race_id
+JOIN
+    series ON series.id=result.series_id
+JOIN
+    racer ON racer.id=result.racer_id
+ORDER BY
+    result.id
+''',
+    'standings': '''
+SELECT
+    series.name AS series,
+    racer.name AS racer,
+    standing.wins AS wins
+FROM
+    standing
+JOIN
+    series ON series.id=standing.series_id
+JOIN
+    racer ON racer.id=standing.racer_id
+ORDER BY
+    series.id,
+    standing.wins DESC,
+    racer.name
+''',
+}
 
 
-def verifyAdminAuth(username, password, encrypted=False):
+def streamExport(db, table, batchSize=1000):
     '''
-    Verify the authentication of a given username/password
+    Stream every row of an export through a server-side cursor so that
+    only batchSize rows are held in memory at a time.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        table (str): Key of EXPORTS
+        batchSize (int): Rows fetched from the db at a time
+
+    Returns:
+        generator - the column names first, then one tuple per row
+    '''
+    connection = db.session.connection().execution_options(
+        stream_results=True)
+    result = connection.execute(EXPORTS[table])
+    try:
+        yield result.keys()
+        while True:
+            rows = result.fetchmany(batchSize)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        result.close()
+
+
+def authenticateAdmin(username, password, encrypted=False):
+    '''
+    Get the admin matching a given username/password with a single lookup
 
     Args:
         username (str): Username to authenticate
-        password (str): Passowrd to authenticate
+        password (str): Password to authenticate
         encrypted (bool): Pass True is given password is encrypted
 
     Returns:
-        bool - True if authenticated, False otherwise
+        Admin - or None if not authenticated
     '''
+    from hmac import compare_digest
+
     from .extensions import encrypt
 
     if not encrypted:
@@ -571,12 +1918,9 @@ def verifyAdminAuth(username, password, encrypted=False):
 
     admin = getAdmin(username=username)
 
-    if not admin:
-        return False
-    elif password != admin.password:
-        return False
-    else:
-        return True
+    if not admin or not compare_digest(password, admin.password):
+        return None
+    return admin
 
 
 def getLastRace():
@@ -592,85 +1936,110 @@ FROM
 
 def activateSeries(series):
     from .models import db
-    db.session.execute(f'''
+    db.session.execute('''
 UPDATE
     series
 SET
-    is_active='f';
+    is_active=:inactive
+WHERE
+    is_active;
+''', {'inactive': False})
+    db.session.execute('''
 UPDATE
     series
 SET
-    is_active='t'
+    is_active=:active
 WHERE
-    name='{series.name}';
-''')
+    name=:name;
+''', {'active': True, 'name': series.name})
+    publishStandings('refresh')
+    bumpDataVersion('series')
     db.session.commit()
+    invalidateIndex()
+    invalidateRegistry('series')
 
 
 def toggleRacer(name):
     from .models import db
-    db.session.execute(f'''
+    db.session.execute('''
 UPDATE
     racer
 SET
     is_active = NOT is_active
 WHERE
-    name='{name}';
-''')
+    name=:name;
+''', {'name': name})
+    publishStandings('refresh')
+    bumpDataVersion('racer')
     db.session.commit()
+    invalidateIndex()
+    invalidateRegistry('racers')
 
 
 def setSeriesWinner(series, racer):
     from .models import db
-    db.session.execute(f'''
+    db.session.execute('''
 UPDATE
     series
 SET
-    winner_id = {racer.id}
+    winner_id = :winner_id
 WHERE
-    id = {series.id};
-''')
+    id = :series_id;
+''', {'winner_id': racer.id, 'series_id': series.id})
+    publishStandings('winner', {'series': series.id, 'winner': racer.name})
+    bumpDataVersion('series')
     db.session.commit()
+    invalidateIndex()
+    invalidateRegistry('series')
 
 
 def activateVideo(video):
     from .models import db
-    db.session.execute(f'''
+    db.session.execute('''
 UPDATE
     video
 SET
-    is_active='f';
+    is_active=:inactive
+WHERE
+    is_active;
+''', {'inactive': False})
+    db.session.execute('''
 UPDATE
     video
 SET
-    is_active='t'
+    is_active=:active
 WHERE
-    url='{video.url}';
-''')
+    url=:url;
+''', {'active': True, 'url': video.url})
+    bumpDataVersion('video')
     db.session.commit()
+    invalidateIndex()
+    invalidateRegistry('videos')
 
 
 def activateEmail(emailaddress):
     from .models import db
-    db.session.execute(f'''
+    db.session.execute('''
 UPDATE
     email
 SET
-    is_active='t'
+    is_active=:active
 WHERE
-    address='{emailaddress}';
-''')
+    address=:address;
+''', {'active': True, 'address': emailaddress})
+    bumpDataVersion('email')
     db.session.commit()
 
 
 def deactivateEmail(emailaddress):
     from .models import db
-    db.session.execute(f'''
+    db.session.execute('''
 UPDATE
     email
 SET
-    is_active='f'
+    is_active=:active
 WHERE
-    address='{emailaddress}';
-''')
+    address=:address;
+''', {'active': False, 'address': emailaddress})
+    bumpDataVersion('email')
     db.session.commit()
@@ -0,0 +1,71 @@
+# exporter.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Turns the rows streamed by db_connector.streamExport
+# into CSV or JSON chunks for a streamed HTTP
+# response, so exports use constant memory.
+
+import csv
+import json
+from io import StringIO
+
+FORMATS = {
+    'csv': 'text/csv',
+    'json': 'application/json',
+}
+
+
+def exportCsv(rows, chunkRows=500):
+    '''
+    Args:
+        rows (iterable): Column names followed by the rows
+        chunkRows (int): Rows written per yielded chunk
+
+    Returns:
+        generator(str) - CSV text, a chunk at a time
+    '''
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    for i, row in enumerate(rows):
+        writer.writerow(row)
+        if i % chunkRows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def exportJson(rows, chunkRows=500):
+    '''
+    Args:
+        rows (iterable): Column names followed by the rows
+        chunkRows (int): Rows written per yielded chunk
+
+    Returns:
+        generator(str) - a JSON array of objects, a chunk at a time
+    '''
+    rows = iter(rows)
+    columns = list(next(rows))
+    chunk = ['[']
+    for i, row in enumerate(rows):
+        separator = ',\n' if i else '\n'
+        chunk.append(separator + json.dumps(dict(zip(columns, row)),
+                                            default=str))
+        if len(chunk) >= chunkRows:
+            yield ''.join(chunk)
+            chunk = []
+    chunk.append('\n]\n')
+    yield ''.join(chunk)
+
+
+def export(rows, format):
+    '''
+    Returns:
+        generator(str) - rows rendered in the given format
+    '''
+    if format == 'csv':
+        return exportCsv(rows)
+    if format == 'json':
+        return exportJson(rows)
+    raise ValueError(f'Unknown export format: {format}')
@@ -43,8 +43,8 @@ def init_db_admin(db, commit=False):
 
 def init_db_testdata(db, commit=False):
     '''
-    Initializes the database with testdata until real data
-    can be included.
+    Initializes an empty database with a small generated season. Use
+    `flask marbles generate` for larger datasets.
 
     Args:
         db (SQLAlchemy): Flask database object created in models.py
@@ -53,50 +53,18 @@ def init_db_testdata(db, commit=False):
     Returns:
         None
     '''
-    from .db_connector import addSeries
-
-    from .models import Racer, Race, Result
-    from datetime import date, timedelta
-    from random import choice
-
-    racerTuples = [
-        ('Black Jack', 16, 44, 'rgb(25, 25, 25)'),
-        ('Green Goblin', 16, 44, 'rgb(5, 99, 10)'),
-        ('White Lightning', 16, 44, 'rgb(150, 150, 150)'),
-        ('Blue Gooze', 16, 44, 'rgb(60, 50, 156)'),
-    ]
-
-    for racerTuple in racerTuples:
-        name, ht, wt, color = racerTuple
-        present = Racer.query.filter_by(name=name).first()
-        if not present:
-            racer = Racer(name, ht, wt, color)
-            db.session.add(racer)
-    if commit:
-        db.session.commit()
-
-    addSeries(db, 'Kynzi Cup', is_active=True, commit=True)
-
-    startDate = date(2020, 3, 28)
-    date = startDate
-    for raceNum in range(1, 10):
-        present = Race.query.filter_by(number=raceNum).first()
-        if not present:
-            race = Race(raceNum, date, 1)
-            date += timedelta(days=1)
-            db.session.add(race)
-    if commit:
-        db.session.commit()
+    from .datagen import generate
+    from .db_connector import getLastRace
+    from datetime import date
 
-    racers = Racer.query.all()
-    races = Race.query.all()
+    if getLastRace():
+        return
 
-    for race in races:
-        winner = choice(racers)
-        result = Result(race.id, winner.id, 1)
-        db.session.add(result)
-    if commit:
-        db.session.commit()
+    generate(db, racers=4, series=1, races=9, subscribers=0, videos=0,
+             racesPerDay=1, startDate=date(2020, 3, 28),
+             racerNames=['Black Jack', 'Green Goblin', 'White Lightning',
+                         'Blue Gooze'],
+             seriesNames=['Kynzi Cup'], commit=commit)
 
 
 def encrypt(string):
@@ -115,25 +83,26 @@ def encrypt(string):
     return hashed
 
 
-def sendEmails(app, email, subject, content, greeting=True, unsubscribe=True):
+def composeEmail(app, email, subject, content, greeting=True,
+                 unsubscribe=True):
     '''
-    Support function specifically to send email alerts
-    to all email addresses available in the database.
+    Support function to build the email alerts sent to
+    the email addresses available in the database.
 
     Args:
+        app (Flask): Flask app, used for SITE_URL
+        email (Email): Email to send to, or a plain address when neither
+            greeting nor unsubscribe is used
         subject (str): Subject of the Email
         content (str): Content of the Email
+        greeting (bool): Set True to greet the subscriber by name
+        unsubscribe (bool): Set True to append an unsubscribe link
 
     Returns:
-        None
+        tup(str, str, str) - address, subject and content
     '''
-    import yagmail
-    GMAIL_USERNAME = app.config['GMAIL_USERNAME']
-    GMAIL_PASSWORD = app.config['GMAIL_PASSWORD']
     SITE_URL = app.config['SITE_URL']
 
-    yag = yagmail.SMTP(GMAIL_USERNAME, GMAIL_PASSWORD)
-
     if greeting:
         # only used for email alerts
         content = f'Hey {email.first}!\n\n' + content
@@ -144,7 +113,8 @@ def sendEmails(app, email, subject, content, greeting=True, unsubscribe=True):
         content += f'\n\nTo be removed from our email list, \
             <a href="{SITE_URL}/email_unsubscribe/{email.address}">unsubscribe</a>'
 
-    yag.send(email.address, subject, content)
+    address = email if isinstance(email, str) else email.address
+    return address, subject, content
 
 
 def to_rgba(rgb, a):
@@ -163,6 +133,149 @@ def to_rgba(rgb, a):
     return rgba
 
 
+def getIndexPayload(db):
+    '''
+    Compute everything the index page needs to render the standings
+    chart and the active video. Only plain values are returned so the
+    payload can be held in the application cache.
+
+    Args:
+        db (SQLAlchemy): flask_sqlalchemy db object
+
+    Returns:
+        dict
+    '''
+    from .db_connector import getRacer, getSeries, getTotalWins, getVideo
+
+    activeSeries = getSeries(active=True)
+    if activeSeries.winner_id:
+        winner = getRacer(id=activeSeries.winner_id)
+        winner = f': Winner {winner.name}!'
+    else:
+        winner = ''
+
+    names = []
+    wins = []
+    borderWidths = []
+    backgroundColors = []
+    hoverColors = []
+    borderColors = []
+    for racer in getTotalWins(db, activeSeries=activeSeries):
+        names.append(racer.name)
+        wins.append(racer.wins)
+        borderWidths.append(1.5)
+        backgroundColors.append(to_rgba(racer.color, 0.4))
+        hoverColors.append(to_rgba(racer.color, 0.7))
+        borderColors.append(to_rgba(racer.color, 1))
+
+    activeVideo = getVideo(active=True)
+    if activeVideo:
+        activeVideo = {'url_embedded': activeVideo.url_embedded}
+
+    return {
+        'activeSeries': activeSeries.name,
+        'activeSeriesId': activeSeries.id,
+        'winner': winner,
+        'names': names,
+        'wins': wins,
+        'borderWidths': borderWidths,
+        'backgroundColors': backgroundColors,
+        'hoverColors': hoverColors,
+        'borderColors': borderColors,
+        'activeVideo': activeVideo,
+    }
+
+
+# tables the standings history payload is built from
+HISTORY_TABLES = ['race', 'racer', 'standing_history']
+
+
+def getHistoryPayload(db, series_id):
+    '''
+    Compute the cumulative wins of each racer in a series, race by race,
+    for the progress chart next to the standings chart. Each racer gets
+    one step per race they won; the chart holds the count flat between
+    steps. Only plain values are returned so the payload can be held in
+    the application cache.
+
+    Args:
+        db (SQLAlchemy): flask_sqlalchemy db object
+        series_id (int): Series id
+
+    Returns:
+        dict
+    '''
+    from .db_connector import getSeriesRaceRange, getStandingHistory
+
+    first, last = getSeriesRaceRange(db, series_id)
+    racers = []
+    for row in getStandingHistory(db, series_id):
+        if not racers or racers[-1]['name'] != row.name:
+            racers.append({
+                'name': row.name,
+                'borderColor': to_rgba(row.color, 1),
+                'steps': [],
+            })
+        racers[-1]['steps'].append([row.race_number, row.wins])
+
+    return {
+        'series': series_id,
+        'first': first,
+        'last': last,
+        'racers': racers,
+    }
+
+
+ADMIN_SECTIONS = ['racers', 'series', 'videos', 'races']
+
+
+def getAdminSection(section):
+    '''
+    Compute the reference data one section of the admin dashboard fills
+    its form choices and lists with, fetched once the section is opened
+    so the dashboard itself renders without touching these tables.
+
+    Args:
+        section (str): One of ADMIN_SECTIONS
+
+    Returns:
+        dict
+    '''
+    from .db_connector import getLastRace
+    from .registry import registry
+
+    if section == 'racers':
+        return {
+            'rows': [{'id': racer.id, 'label': racer.name,
+                      'active': racer.is_active}
+                     for racer in registry.racers()],
+        }
+    if section == 'series':
+        return {
+            'rows': [{'id': series.id, 'label': series.name,
+                      'active': series.is_active}
+                     for series in registry.series()],
+            'active': registry.activeSeries().name,
+        }
+    if section == 'videos':
+        videos = registry.videos()
+        activeVideo = registry.activeVideo()
+        return {
+            'rows': [{'id': video.id,
+                      'label': f'{video.groupname} - {video.name}',
+                      'groupname': video.groupname, 'name': video.name,
+                      'description': video.description, 'url': video.url,
+                      'active': video.is_active}
+                     for video in videos],
+            'groups': sorted({video.groupname for video in videos}),
+            'active': f'{activeVideo.groupname} - {activeVideo.name}'
+            if activeVideo else 'None',
+        }
+    if section == 'races':
+        return {'next': getLastRace() + 1}
+    raise ValueError(f'Unknown admin section: {section}')
+
+
 def getEmbedded(url):
     '''
     Converts regular YouTube video URL into Embedded link.
@@ -9,25 +9,29 @@ from os import environ
 
 from flask_wtf import FlaskForm
 from flask_wtf.csrf import CSRFProtect
+from flask_wtf.file import FileAllowed, FileField, FileRequired
 from wtforms import (BooleanField, IntegerField, PasswordField, SelectField,
                      StringField, SubmitField, TextAreaField)
 from wtforms.fields.html5 import DateField, EmailField
 from wtforms.validators import DataRequired, EqualTo, ValidationError
 
-from .db_connector import getLastRace, getRacer, getSeries, getVideo
 from .extensions import encrypt
+from .importer import FORMATS
+from .registry import registry
 
 csrf = CSRFProtect()
 
 
 def admin_validation(form, field):
     '''
-    Custom Validator for Admin Sign-In page
+    Custom Validator for Admin Sign-In page. Keeps the authenticated
+    admin on form.admin so the route doesn't have to look it up again.
     '''
-    from .db_connector import verifyAdminAuth
+    from .db_connector import authenticateAdmin
     username = form.username.data
     password = form.password.data
-    if not verifyAdminAuth(username, password, encrypted=False):
+    form.admin = authenticateAdmin(username, password, encrypted=False)
+    if form.admin is None:
         raise ValidationError('Incorrect username/password combo')
 
 
@@ -176,10 +180,26 @@ class updateRaceDataForm(FlaskForm):
 
     def __init__(self):
         super(updateRaceDataForm, self).__init__()
-        self.winner.choices = [
-            (racer.id, racer.name) for racer in getRacer(all=True)
-        ]
-        self.race_number.data = getLastRace() + 1
+        # choices are only needed to validate a submission, the admin
+        # page fetches them for display (see getAdminSection)
+        self.winner.choices = []
+        if self.is_submitted():
+            self.winner.choices = [
+                (racer.id, racer.name) for racer in registry.racers()
+            ]
+
+
+class importResultsForm(FlaskForm):
+    '''
+    Form to upload a season of race results at once
+    '''
+
+    file = FileField('Results File', [
+        FileRequired(),
+        FileAllowed(FORMATS, 'Upload a .csv, .json or .jsonl file')
+    ])
+
+    submit = SubmitField('Import')
 
 
 class activateSeriesForm(FlaskForm):
@@ -193,9 +213,11 @@ class activateSeriesForm(FlaskForm):
 
     def __init__(self):
         super(activateSeriesForm, self).__init__()
-        self.series.choices = [
-            (series.id, series.name) for series in getSeries(all=True)
-        ]
+        self.series.choices = []
+        if self.is_submitted():
+            self.series.choices = [
+                (series.id, series.name) for series in registry.series()
+            ]
 
 
 class toggleActiveRacerForm(FlaskForm):
@@ -261,12 +283,15 @@ class seriesWinnerForm(FlaskForm):
 
     def __init__(self):
         super(seriesWinnerForm, self).__init__()
-        self.series.choices = [
-            (series.id, series.name) for series in getSeries(all=True)
-        ]
-        self.winner.choices = [
-            (racer.id, racer.name) for racer in getRacer(all=True)
-        ]
+        self.series.choices = []
+        self.winner.choices = []
+        if self.is_submitted():
+            self.series.choices = [
+                (series.id, series.name) for series in registry.series()
+            ]
+            self.winner.choices = [
+                (racer.id, racer.name) for racer in registry.racers()
+            ]
 
 
 class addVideoForm(FlaskForm):
@@ -311,7 +336,9 @@ class ManageVideoForm(FlaskForm):
 
     def __init__(self):
         super(ManageVideoForm, self).__init__()
-        self.video.choices = [
-            (video.id, f'{video.groupname} - {video.name}')
-            for video in getVideo(all=True)
-        ]
+        self.video.choices = []
+        if self.is_submitted():
+            self.video.choices = [
+                (video.id, f'{video.groupname} - {video.name}')
+                for video in registry.videos()
+            ]
@@ -0,0 +1,89 @@
+# fragments.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Jinja {% cache %} tag for template fragments that
+# only change with the tables they show. Rendered
+# fragments are kept in an in-process LRU, keyed on
+# the fragment, the versions of its tables and any
+# other values it depends on, so a write to one of
+# those tables is all it takes to render it again.
+
+import json
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from .cache import MemoryBackend
+from .metrics import metrics
+
+
+class FragmentCacheExtension(Extension):
+    '''
+    {% cache name, tables, values... %} ... {% endcache %}
+
+    name is the fragment's name, tables the list of tables it shows and
+    values anything else its output depends on. The body only runs on a
+    miss, so queries made from inside it are skipped on a hit too.
+    '''
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('render', [nodes.List(args)]),
+                               [], [], body).set_lineno(lineno)
+
+    def render(self, args, caller):
+        return fragments.cached(args[0], args[1], args[2:], caller)
+
+
+class Fragments:
+    '''
+    Store behind the {% cache %} tag. Call init_app() from the app factory
+    to register the tag; each gunicorn worker keeps its own fragments.
+    '''
+
+    def __init__(self):
+        self.store = MemoryBackend()
+
+    def init_app(self, app):
+        self.store = MemoryBackend(app.config['FRAGMENT_CACHE_SIZE'])
+        app.jinja_env.add_extension(FragmentCacheExtension)
+
+    def cached(self, name, tables, values, render):
+        '''
+        Return the stored fragment, calling render() to build and store
+        it on a miss.
+
+        Args:
+            name (str): Fragment name
+            tables (list(str)): Tables the fragment shows
+            values (list): Anything else the fragment depends on (JSON
+                serializable)
+            render (callable): Renders the fragment
+
+        Returns:
+            Markup
+        '''
+        from .conditional import conditional
+
+        versions = conditional.current()['tables']
+        key = json.dumps([name, [versions.get(table, 0) for table in tables],
+                          values], sort_keys=True, default=str)
+        html = self.store.get(key)
+        metrics.cacheLookup(f'fragment:{name}', html is not None)
+        if html is None:
+            html = str(render())
+            self.store.set(key, html)
+        return Markup(html)
+
+    def clear(self):
+        self.store.clear()
+
+
+fragments = Fragments()
@@ -0,0 +1,221 @@
+# importer.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Bulk import of race results from a CSV or JSON
+# file, used by the admin upload and by
+# `flask marbles import` to back-fill whole seasons.
+
+import csv
+import json
+from collections import Counter
+from datetime import date
+from itertools import islice
+from time import perf_counter
+
+FORMATS = ['csv', 'json', 'jsonl']
+
+# each row binds 3 parameters per statement, which must stay under the
+# 65535 Postgres (and 32766 sqlite) allows
+MAX_BATCH_SIZE = 10000
+
+# characters that can carry on a JSON number
+NUMBER = set('0123456789+-.eE')
+
+
+def readJsonArray(stream, chunkSize=1 << 16):
+    '''
+    Lazily read the items of a JSON array, holding only a chunk of the
+    stream (and the item being read) in memory at a time.
+
+    Args:
+        stream (file): Text stream holding one JSON array
+        chunkSize (int): Characters read at a time
+
+    Returns:
+        generator
+    '''
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+
+    def more():
+        # drop what was read and append the next chunk
+        nonlocal buffer, position, eof
+        chunk = stream.read(chunkSize)
+        eof = not chunk
+        buffer, position = buffer[position:] + chunk, 0
+
+    def skip():
+        # move past whitespace, returning the next character (or '')
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer) or eof:
+                return buffer[position:position + 1]
+            more()
+
+    def finish():
+        nonlocal position
+        position += 1
+        if skip():
+            raise ValueError('Unexpected data after the JSON array')
+
+    if skip() != '[':
+        raise ValueError('Expected a JSON array')
+    position += 1
+    if skip() == ']':
+        finish()
+        return
+    while True:
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError('Invalid JSON array')
+                end = None
+            # a number cut off by the end of the buffer still decodes
+            if end is not None and (eof or (
+                    end < len(buffer) and buffer[end] not in NUMBER)):
+                break
+            more()
+        yield item
+        position = end
+
+        separator = skip()
+        if separator == ']':
+            finish()
+            return
+        if separator != ',':
+            raise ValueError('Invalid JSON array')
+        position += 1
+        skip()
+
+
+def readResults(stream, format):
+    '''
+    Lazily read result rows from a text stream. Every row needs a
+    race_number, date (YYYY-MM-DD), cup and winner (racer name).
+
+    Args:
+        stream (file): Text stream to read
+        format (str): csv, json (an array of objects) or jsonl (one
+            object per line)
+
+    Returns:
+        generator(dict)
+    '''
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        try:
+            yield from reader
+        except csv.Error as error:
+            raise ValueError(
+                f'Line {reader.reader.line_num}: invalid CSV ({error})')
+    elif format == 'json':
+        yield from readJsonArray(stream)
+    elif format == 'jsonl':
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError(f'Unknown import format: {format}')
+
+
+def parseResult(line, row, racers):
+    '''
+    Returns:
+        tup(int, date, str, int) - race number, date, cup and racer id
+    '''
+    try:
+        number = int(row['race_number'])
+        raceDate = date.fromisoformat(str(row['date']))
+        cup = row['cup'].strip()
+        winner = row['winner'].strip().title()
+    except (KeyError, TypeError, ValueError, AttributeError) as error:
+        raise ValueError(f'Row {line}: invalid row {row!r} ({error})')
+    if winner not in racers:
+        raise ValueError(f'Row {line}: unknown racer {winner!r}')
+
+    return number, raceDate, cup, racers[winner]
+
+
+def importResults(db, rows, batchSize=1000, commit=False):
+    '''
+    Write races, series and results for every row in one transaction.
+    Racer names are resolved with a lookup built once up front, each
+    batch of rows costs one upsert for its races (and series) and one
+    multi-row insert for its results, and standings are updated with a
+    single statement at the end. Races that already have a result are
+    skipped so a file can safely be imported twice.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        rows (iterable(dict)): Rows as produced by readResults
+        batchSize (int): Number of rows written per statement, up to
+            MAX_BATCH_SIZE
+        commit (bool): Set True to commit changes
+
+    Returns:
+        dict - rows read, results added, rows skipped, seconds taken and
+        rows per second
+    '''
+    from .db_connector import (addRaces, addResults, addStandings,
+                               rebuildStandingHistory)
+    from .models import Racer, Result
+
+    if not 1 <= batchSize <= MAX_BATCH_SIZE:
+        raise ValueError(f'Batch size must be 1 to {MAX_BATCH_SIZE}')
+
+    started = perf_counter()
+    racers = dict(db.session.query(Racer.name, Racer.id))
+    wins = Counter()
+    read = added = 0
+
+    rows = iter(rows)
+    try:
+        while True:
+            batch = [parseResult(read + i + 1, row, racers)
+                     for i, row in enumerate(islice(rows, batchSize))]
+            if not batch:
+                break
+            read += len(batch)
+
+            races = {race.number: race for race in addRaces(
+                db, [(number, raceDate, cup)
+                     for number, raceDate, cup, _ in batch])}
+            finished = {race_id for race_id, in db.session.query(
+                Result.race_id).filter(Result.race_id.in_(
+                    [race.id for race in races.values()]))}
+
+            results = []
+            for number, _, _, racer_id in batch:
+                race = races[number]
+                if race.id in finished:
+                    continue
+                finished.add(race.id)
+                results.append((race.id, racer_id, race.series_id))
+                wins[(race.series_id, racer_id)] += 1
+            added += addResults(db, results)
+
+        addStandings(db, wins)
+        if wins:
+            rebuildStandingHistory(
+                db, series=sorted({series_id for series_id, _ in wins}))
+        if commit:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    seconds = perf_counter() - started
+    return {
+        'rows': read,
+        'results': added,
+        'skipped': read - added,
+        'seconds': round(seconds, 3),
+        'rowsPerSecond': round(read / seconds, 1) if seconds else 0.0,
+    }
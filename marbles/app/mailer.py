@@ -0,0 +1,190 @@
+# mailer.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Sends the mail queued in the outbox table through
+# a fixed-size pool of worker threads, each holding one
+# authenticated SMTP session that it reuses for many
+# messages. Run by worker.py, never by the web workers.
+
+import smtplib
+from threading import Event, Lock, Thread
+from time import monotonic
+
+
+class MailStats:
+    '''
+    Thread-safe throughput/failure counters shared by the mail workers.
+    '''
+
+    def __init__(self):
+        self.lock = Lock()
+        self.sent = 0
+        self.failed = 0
+        self.logins = 0
+        self.busy = 0.0
+
+    def record(self, sent=0, failed=0, logins=0, busy=0.0):
+        with self.lock:
+            self.sent += sent
+            self.failed += failed
+            self.logins += logins
+            self.busy += busy
+
+    def snapshot(self):
+        '''
+        Returns:
+            dict - sent, failed, logins and messages/second of busy time
+        '''
+        with self.lock:
+            throughput = self.sent / self.busy if self.busy else 0.0
+            return {
+                'sent': self.sent,
+                'failed': self.failed,
+                'logins': self.logins,
+                'throughput': round(throughput, 2),
+            }
+
+
+class MailSession:
+    '''
+    One SMTP connection that is logged into once and then reused.
+    yagmail.SMTP.send() logs in again on every call, so messages are
+    prepared with yagmail and written to the open connection directly.
+    '''
+
+    def __init__(self, config, stats):
+        import yagmail
+        self.yag = yagmail.SMTP(config['GMAIL_USERNAME'],
+                                config['GMAIL_PASSWORD'],
+                                host=config['MAIL_HOST'],
+                                port=config['MAIL_PORT'],
+                                smtp_ssl=config['MAIL_SSL'],
+                                smtp_starttls=config['MAIL_STARTTLS'],
+                                smtp_skip_login=config['MAIL_SKIP_LOGIN'])
+        self.stats = stats
+        self.connected = False
+
+    def connect(self):
+        self.yag.login()
+        self.connected = True
+        self.stats.record(logins=1)
+
+    def send(self, to, subject, content):
+        if not self.connected:
+            self.connect()
+        recipients, message = self.yag.prepare_send(to, subject, content)
+        try:
+            self.yag.smtp.sendmail(self.yag.user, recipients, message)
+        except smtplib.SMTPServerDisconnected:
+            # the server dropped an idle session, log in again once
+            self.connect()
+            self.yag.smtp.sendmail(self.yag.user, recipients, message)
+
+    def close(self):
+        if self.connected:
+            self.yag.close()
+            self.connected = False
+
+
+class OutboxWorker:
+    '''
+    Drains the outbox table with MAIL_WORKERS threads. Each thread holds
+    one SMTP session and repeatedly claims a batch of due emails with
+    SELECT ... FOR UPDATE SKIP LOCKED, committing the claim before it
+    sends anything, so threads (and separate worker processes) never send
+    the same email twice. Each email's outcome is committed as soon as it
+    is sent. A claim lasts MAIL_LEASE seconds; emails left sending by a
+    worker that died are put back when it runs out. Sessions are closed
+    after MAIL_IDLE_TIMEOUT seconds without work.
+    '''
+
+    def __init__(self, app):
+        self.app = app
+        self.config = app.config
+        self.stats = MailStats()
+        self.stopping = Event()
+        self.threads = []
+
+    def start(self):
+        for _ in range(self.config['MAIL_WORKERS']):
+            thread = Thread(target=self.work, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        '''
+        Ask the threads to exit once their current batch is done.
+        '''
+        self.stopping.set()
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+    def work(self):
+        with self.app.app_context():
+            session = MailSession(self.config, self.stats)
+            idle = 0.0
+            while not self.stopping.is_set():
+                sent = self.drain(session)
+                if sent:
+                    idle = 0.0
+                    continue
+
+                if idle >= self.config['MAIL_IDLE_TIMEOUT']:
+                    session.close()
+                poll = self.config['MAIL_POLL_INTERVAL']
+                self.stopping.wait(poll)
+                idle += poll
+            session.close()
+
+    def drain(self, session):
+        '''
+        Claim, send and record one batch of emails.
+
+        Returns:
+            int - number of emails claimed
+        '''
+        from .db_connector import (claimOutbox, expireOutboxLeases,
+                                   markOutboxFailed, markOutboxSent)
+        from .models import db
+
+        lease = self.config['MAIL_LEASE']
+        try:
+            expireOutboxLeases(db, self.config['MAIL_MAX_ATTEMPTS'])
+            claimed = monotonic()
+            batch = claimOutbox(db, self.config['MAIL_BATCH_SIZE'], lease,
+                                commit=True)
+            for id, recipient, subject, content, attempts in batch:
+                if monotonic() - claimed >= lease:
+                    # the rest may already be claimed by another worker,
+                    # they are put back by expireOutboxLeases
+                    self.app.logger.warning(
+                        'Outbox claim expired before the batch was sent')
+                    break
+                started = monotonic()
+                try:
+                    session.send(recipient, subject, content)
+                except Exception as error:
+                    markOutboxFailed(db, id, attempts, error,
+                                     self.config['MAIL_MAX_ATTEMPTS'],
+                                     self.config['MAIL_RETRY_BACKOFF'],
+                                     commit=True)
+                    self.stats.record(failed=1, busy=monotonic() - started)
+                    self.app.logger.exception(
+                        f'Failed to send email to {recipient}')
+                    session.close()
+                    continue
+                markOutboxSent(db, id, commit=True)
+                self.stats.record(sent=1, busy=monotonic() - started)
+        except Exception:
+            db.session.rollback()
+            self.app.logger.exception('Failed to drain the outbox')
+            self.stopping.wait(self.config['MAIL_POLL_INTERVAL'])
+            return 0
+
+        if batch:
+            stats = self.stats.snapshot()
+            self.app.logger.info(f'Sent a batch of {len(batch)}: {stats}')
+        return len(batch)
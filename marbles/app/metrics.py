@@ -0,0 +1,127 @@
+# metrics.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Prometheus metrics served at /metrics: request
+# latency and db time per endpoint, cache hits and
+# misses, and outbox email totals. Under gunicorn set
+# PROMETHEUS_MULTIPROC_DIR so every worker process
+# writes to (and /metrics reads from) one directory.
+
+from os import environ
+from time import perf_counter
+
+from flask import Response, g, request
+
+
+class OutboxCollector:
+    '''
+    Reads the outbox totals from the db at scrape time, so emails sent
+    by any mail worker process or container are counted exactly once.
+    '''
+
+    def collect(self):
+        from prometheus_client.core import (CounterMetricFamily,
+                                            GaugeMetricFamily)
+        from .db_connector import countOutbox
+        from .models import db
+
+        counts = countOutbox(db)
+        emails = CounterMetricFamily('marbles_emails',
+                                     'Emails sent or given up on',
+                                     labels=['status'])
+        for status in ('sent', 'failed'):
+            emails.add_metric([status], counts.get(status, 0))
+        yield emails
+        yield GaugeMetricFamily('marbles_outbox_pending',
+                                'Emails waiting in the outbox',
+                                value=counts.get('pending', 0) +
+                                counts.get('sending', 0))
+
+
+class Metrics:
+    '''
+    Collects request and cache metrics. Call init_app() from the app
+    factory; METRICS_ENABLED turns it off (prometheus_client is then
+    never imported).
+    '''
+
+    def __init__(self):
+        self.enabled = False
+        self.requestLatency = None
+
+    def init_app(self, app):
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        from prometheus_client import Counter, Histogram
+        # metrics are process-wide, only create them for the first app
+        if self.requestLatency is None:
+            self.requestLatency = Histogram(
+                'marbles_request_duration_seconds',
+                'Time spent handling a request',
+                ['endpoint', 'method', 'status'])
+            self.dbTime = Histogram(
+                'marbles_request_db_seconds',
+                'Time spent running SQL while handling a request',
+                ['endpoint'])
+            self.cacheLookups = Counter(
+                'marbles_cache_lookups_total',
+                'Cache lookups by cache name and hit or miss',
+                ['cache', 'result'])
+
+        self.enabled = True
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics)
+
+    def cacheLookup(self, key, hit):
+        '''
+        Count a cache lookup. Keys are grouped by their prefix, up to the
+        first colon, to keep the number of series small.
+        '''
+        if self.enabled:
+            self.cacheLookups.labels(key.split(':')[0],
+                                     'hit' if hit else 'miss').inc()
+
+    def before_request(self):
+        g.requestStarted = perf_counter()
+
+    def after_request(self, response):
+        started = g.get('requestStarted')
+        if started is None:
+            return response
+
+        endpoint = request.endpoint or 'none'
+        self.requestLatency.labels(endpoint, request.method,
+                                   response.status_code).observe(
+            perf_counter() - started)
+        # db time comes from the query profiler when it is enabled
+        stats = g.get('queryStats')
+        if stats is not None:
+            self.dbTime.labels(endpoint).observe(stats.dbTime)
+        return response
+
+    def metrics(self):
+        '''
+        Serve every metric in the Prometheus text format, merged across
+        worker processes in multiprocess mode.
+        '''
+        from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                                       CollectorRegistry, generate_latest)
+        from prometheus_client import multiprocess
+
+        if 'PROMETHEUS_MULTIPROC_DIR' in environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        # read from the db on every scrape rather than kept per process
+        outbox = CollectorRegistry(auto_describe=False)
+        outbox.register(OutboxCollector())
+
+        output = generate_latest(registry) + generate_latest(outbox)
+        return Response(output, content_type=CONTENT_TYPE_LATEST)
+
+
+metrics = Metrics()
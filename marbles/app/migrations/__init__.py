@@ -0,0 +1,533 @@
+# migrations/__init__.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Versioned schema changes for databases created
+# before a model changed. db.create_all() only
+# creates missing tables, so every change to an
+# existing table needs a vNNNN_*.py module here with
+# a `revision` number, a `description` and
+# upgrade(op)/downgrade(op) functions.
+#
+# Migrations are transactional unless they set
+# `transactional = False`, in which case each
+# operation commits on its own. That is required for
+# op.createIndex(concurrently=True) and op.backfill(),
+# and means every operation must be safe to re-run.
+
+import importlib
+import pkgutil
+from contextlib import contextmanager
+
+# pg_advisory_lock key held while the schema is created or migrated
+LOCK_KEY = 0x6d617262
+
+
+class Operations:
+    '''
+    Schema operations handed to a migration's upgrade()/downgrade().
+    '''
+
+    def __init__(self, db, transactional=True, log=print):
+        self.db = db
+        self.transactional = transactional
+        self.log = log
+
+    @property
+    def dialect(self):
+        return self.db.engine.dialect.name
+
+    def execute(self, sql, params=None):
+        '''
+        Run a statement in the migration's transaction (or commit it
+        straight away in a non-transactional migration).
+        '''
+        result = self.db.session.execute(sql, params or {})
+        if not self.transactional:
+            self.db.session.commit()
+        return result
+
+    def executeAutocommit(self, sql):
+        '''
+        Run a statement outside of any transaction, as required by
+        CREATE/DROP INDEX CONCURRENTLY.
+        '''
+        if self.transactional:
+            raise RuntimeError('Set transactional = False in a migration '
+                               'that runs statements outside a transaction')
+        # an open transaction on our own session would make a concurrent
+        # index build wait for it forever
+        self.db.session.commit()
+        with self.db.engine.connect() as connection:
+            connection.execution_options(
+                isolation_level='AUTOCOMMIT').execute(sql)
+
+    def createIndex(self, name, table, columns, where=None,
+                    concurrently=True, unique=False):
+        '''
+        Create an index if it doesn't exist. With concurrently=True (and
+        Postgres) the table stays readable and writable during the build.
+        A unique index is refused while rows share its values, rather than
+        left half built.
+
+        Args:
+            name (str): Index name
+            table (str): Table to index
+            columns (str): Comma separated column list
+            where (str): Condition for a partial index
+            concurrently (bool): Set False to build inside the transaction
+            unique (bool): Set True for a unique index
+        '''
+        if unique:
+            duplicates = self.findDuplicates(table, columns, where=where)
+            if duplicates['values']:
+                raise RuntimeError(
+                    f'{name} can\'t be built: {duplicates["values"]} '
+                    f'({columns}) value(s) are shared by more than one '
+                    f'{table} row (e.g. '
+                    f'{", ".join(map(str, duplicates["sample"]))}). Merge or '
+                    f'delete them, then upgrade again. Find them with:\n'
+                    f'{duplicates["query"]}')
+
+        where = f'WHERE {where}' if where else ''
+        index = 'UNIQUE INDEX' if unique else 'INDEX'
+        if not concurrently or self.dialect != 'postgresql':
+            self.execute(f'''
+CREATE {index} IF NOT EXISTS
+    {name} ON {table} ({columns}) {where};
+''')
+            return
+
+        # a failed concurrent build leaves an invalid index behind which
+        # IF NOT EXISTS would silently keep
+        invalid = self.db.session.execute('''
+SELECT
+    1
+FROM
+    pg_index
+JOIN
+    pg_class ON pg_class.oid=pg_index.indexrelid
+WHERE
+    pg_class.relname=:name
+    AND NOT pg_index.indisvalid;
+''', {'name': name}).first()
+        if invalid:
+            self.log(f'Dropping invalid index {name}')
+            self.executeAutocommit(f'DROP INDEX CONCURRENTLY {name};')
+
+        self.log(f'Building index {name} concurrently')
+        self.executeAutocommit(f'''
+CREATE {index} CONCURRENTLY IF NOT EXISTS
+    {name} ON {table} ({columns}) {where};
+''')
+
+    def findDuplicates(self, table, columns, where=None, limit=10):
+        '''
+        Look for rows sharing the same values of columns, which keep a
+        unique index on them from being built.
+
+        Args:
+            table (str): Table to check
+            columns (str): Comma separated column list
+            where (str): Condition of a partial index
+            limit (int): Number of duplicated values to return
+
+        Returns:
+            dict - values (int) shared by more than one row, a sample
+            (list of up to limit tuples of the values and their row
+            count) and the query (str) that lists them
+        '''
+        where = f'WHERE {where}' if where else ''
+        query = f'''
+SELECT
+    {columns},
+    COUNT(*) AS copies
+FROM
+    {table}
+{where}
+GROUP BY
+    {columns}
+HAVING
+    COUNT(*) > 1'''
+        values = self.db.session.execute(f'''
+SELECT
+    COUNT(*)
+FROM
+    ({query}) AS duplicates;
+''').scalar()
+        sample = [tuple(row) for row in self.db.session.execute(f'''
+{query}
+ORDER BY
+    {columns}
+LIMIT :limit;
+''', {'limit': limit})]
+        return {
+            'values': values,
+            'sample': sample,
+            'query': f'{" ".join(query.split())};',
+        }
+
+    def dropIndex(self, name, concurrently=True):
+        '''
+        Drop an index if it exists, concurrently when possible.
+        '''
+        if not concurrently or self.dialect != 'postgresql':
+            self.execute(f'DROP INDEX IF EXISTS {name};')
+        else:
+            self.executeAutocommit(
+                f'DROP INDEX CONCURRENTLY IF EXISTS {name};')
+
+    def addForeignKey(self, table, column, references):
+        '''
+        Add a {table}_{column}_fkey foreign key if it doesn't exist. It is
+        added NOT VALID first so existing rows are then checked by
+        VALIDATE, which doesn't block reads or writes. A key left NOT VALID
+        by an earlier run that failed to validate is validated again.
+        '''
+        from sqlalchemy.exc import IntegrityError
+
+        if self.dialect != 'postgresql':
+            # sqlite can't add constraints to an existing table
+            return
+
+        name = f'{table}_{column}_fkey'
+        validated = self.db.session.execute('''
+SELECT
+    convalidated
+FROM
+    pg_constraint
+WHERE
+    conname=:name
+    AND conrelid=CAST(:table AS regclass);
+''', {'name': name, 'table': table}).scalar()
+        if validated:
+            return
+
+        if validated is None:
+            self.execute(f'''
+ALTER TABLE
+    {table}
+ADD CONSTRAINT
+    {name} FOREIGN KEY ({column}) REFERENCES {references} (id) NOT VALID;
+''')
+        else:
+            self.log(f'Validating {name}, left NOT VALID by an earlier run')
+        try:
+            self.execute(f'''
+ALTER TABLE
+    {table}
+VALIDATE CONSTRAINT
+    {name};
+''')
+        except IntegrityError:
+            self.db.session.rollback()
+            orphans = self.findOrphans(table, column, references)
+            raise RuntimeError(
+                f'{name} can\'t be validated: {orphans["rows"]} {table} '
+                f'row(s) have a {column} that isn\'t a {references} id '
+                f'(e.g. {", ".join(map(str, orphans["missing"]))}). Fix or '
+                f'delete them, then upgrade again. Find them with:\n'
+                f'{orphans["query"]}')
+
+    def findOrphans(self, table, column, references, limit=10):
+        '''
+        Look for rows whose foreign key column points at a row that
+        doesn't exist, which keep a foreign key from validating.
+
+        Args:
+            table (str): Table holding the foreign key
+            column (str): Foreign key column
+            references (str): Table the key points at (by id)
+            limit (int): Number of missing ids to return
+
+        Returns:
+            dict - rows (int), missing (list of up to limit ids) and the
+            query (str) that selects the rows
+        '''
+        where = f'''
+    {table}.{column} IS NOT NULL
+    AND NOT EXISTS (
+        SELECT 1 FROM {references} WHERE {references}.id={table}.{column}
+    )'''
+        rows = self.db.session.execute(f'''
+SELECT
+    COUNT(*)
+FROM
+    {table}
+WHERE{where};
+''').scalar()
+        missing = [id for id, in self.db.session.execute(f'''
+SELECT DISTINCT
+    {table}.{column}
+FROM
+    {table}
+WHERE{where}
+ORDER BY
+    {table}.{column}
+LIMIT :limit;
+''', {'limit': limit})]
+        return {
+            'rows': rows,
+            'missing': missing,
+            'query': f'SELECT * FROM {table} WHERE {" ".join(where.split())};',
+        }
+
+    def dropForeignKey(self, table, column):
+        if self.dialect != 'postgresql':
+            return
+        self.execute(f'''
+ALTER TABLE
+    {table}
+DROP CONSTRAINT IF EXISTS
+    {table}_{column}_fkey;
+''')
+
+    def backfill(self, table, values, where, batchSize=1000, key='id'):
+        '''
+        Run `UPDATE table SET values WHERE where` in batches of batchSize
+        consecutive keys, committing after each batch so no long-lived
+        lock is held on a large table.
+
+        Args:
+            table (str): Table to update
+            values (str): SET clause, e.g. "total = 0"
+            where (str): Rows still needing the backfill
+            batchSize (int): Number of keys per batch
+            key (str): Integer key column to walk
+
+        Returns:
+            int - number of rows updated
+        '''
+        bounds = self.db.session.execute(f'''
+SELECT
+    MIN({key}) AS low,
+    MAX({key}) AS high
+FROM
+    {table};
+''').first()
+        if bounds.low is None:
+            return 0
+
+        updated = 0
+        start = bounds.low
+        while start <= bounds.high:
+            result = self.db.session.execute(f'''
+UPDATE
+    {table}
+SET
+    {values}
+WHERE
+    {key} >= :start
+    AND {key} < :end
+    AND ({where});
+''', {'start': start, 'end': start + batchSize})
+            self.db.session.commit()
+            updated += result.rowcount
+            start += batchSize
+
+        self.log(f'Backfilled {updated} row(s) of {table}')
+        return updated
+
+
+@contextmanager
+def lock(db, log=print):
+    '''
+    Hold a Postgres advisory lock for the duration of the block, so only
+    one bootstrap, upgrade or downgrade runs at a time however many
+    containers start at once. The lock is held on a connection of its own
+    because migrations commit (and open connections) as they go.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        log (callable): Called with a line when the lock is busy
+    '''
+    from sqlalchemy import text
+
+    if db.engine.dialect.name != 'postgresql':
+        yield
+        return
+
+    connection = db.engine.connect()
+    try:
+        locked = connection.execute(text('SELECT pg_try_advisory_lock(:key);'),
+                                    {'key': LOCK_KEY}).scalar()
+        if not locked:
+            log('Waiting for another migration to finish')
+            connection.execute(text('SELECT pg_advisory_lock(:key);'),
+                               {'key': LOCK_KEY})
+        try:
+            yield
+        finally:
+            connection.execute(text('SELECT pg_advisory_unlock(:key);'),
+                               {'key': LOCK_KEY})
+    finally:
+        connection.close()
+
+
+def getMigrations():
+    '''
+    Return every migration module ordered by revision.
+
+    Returns:
+        list(module)
+    '''
+    modules = [
+        importlib.import_module(f'{__name__}.{name}')
+        for _, name, _ in pkgutil.iter_modules(__path__)
+        if name.startswith('v')
+    ]
+    return sorted(modules, key=lambda module: module.revision)
+
+
+def createVersionTable(db):
+    '''
+    Create the table recording which migrations have been applied.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+    '''
+    db.session.execute('''
+CREATE TABLE IF NOT EXISTS schema_version (
+    revision INTEGER PRIMARY KEY,
+    description VARCHAR NOT NULL,
+    applied_date TIMESTAMP NOT NULL
+);
+''')
+    db.session.commit()
+
+
+def getAppliedRevisions(db):
+    '''
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+
+    Returns:
+        dict(int: datetime) - applied revisions and when they were applied
+    '''
+    createVersionTable(db)
+    rows = db.session.execute('''
+SELECT
+    revision,
+    applied_date
+FROM
+    schema_version;
+''')
+    return {row.revision: row.applied_date for row in rows}
+
+
+def recordRevision(db, migration):
+    from datetime import datetime
+    db.session.execute('''
+INSERT INTO
+    schema_version (revision, description, applied_date)
+VALUES
+    (:revision, :description, :applied_date);
+''', {'revision': migration.revision,
+      'description': migration.description,
+      'applied_date': datetime.utcnow()})
+
+
+def removeRevision(db, migration):
+    db.session.execute('''
+DELETE FROM
+    schema_version
+WHERE
+    revision=:revision;
+''', {'revision': migration.revision})
+
+
+def stamp(db):
+    '''
+    Mark every migration as applied without running it. Used right after
+    db.create_all() builds a brand new database from the current models.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+    '''
+    applied = getAppliedRevisions(db)
+    for migration in getMigrations():
+        if migration.revision not in applied:
+            recordRevision(db, migration)
+    db.session.commit()
+
+
+def status(db):
+    '''
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+
+    Returns:
+        list(tup(int, str, datetime)) - revision, description and applied
+        date (None when pending) of every migration
+    '''
+    applied = getAppliedRevisions(db)
+    return [
+        (migration.revision, migration.description,
+         applied.get(migration.revision))
+        for migration in getMigrations()
+    ]
+
+
+def run(db, migration, direction, log):
+    transactional = getattr(migration, 'transactional', True)
+    op = Operations(db, transactional=transactional, log=log)
+    try:
+        getattr(migration, direction)(op)
+        if direction == 'upgrade':
+            recordRevision(db, migration)
+        else:
+            removeRevision(db, migration)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def upgrade(db, target=None, log=print):
+    '''
+    Apply every pending migration up to and including target, in order.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        target (int): Last revision to apply (defaults to the latest)
+        log (callable): Called with a line of progress for each migration
+
+    Returns:
+        int - number of migrations applied
+    '''
+    applied = getAppliedRevisions(db)
+    pending = [migration for migration in getMigrations()
+               if migration.revision not in applied
+               and (target is None or migration.revision <= target)]
+    for migration in pending:
+        log(f'Applying {migration.revision}: {migration.description}')
+        run(db, migration, 'upgrade', log)
+
+    return len(pending)
+
+
+def downgrade(db, target=None, log=print):
+    '''
+    Revert applied migrations newer than target, newest first.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        target (int): Revision to end on (defaults to one step back)
+        log (callable): Called with a line of progress for each migration
+
+    Returns:
+        int - number of migrations reverted
+    '''
+    applied = getAppliedRevisions(db)
+    reverting = [migration for migration in reversed(getMigrations())
+                 if migration.revision in applied]
+    if target is None:
+        reverting = reverting[:1]
+    else:
+        reverting = [migration for migration in reverting
+                     if migration.revision > target]
+    for migration in reverting:
+        log(f'Reverting {migration.revision}: {migration.description}')
+        run(db, migration, 'downgrade', log)
+
+    return len(reverting)
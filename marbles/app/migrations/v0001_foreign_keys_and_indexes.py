@@ -0,0 +1,51 @@
+# v0001_foreign_keys_and_indexes.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Adds the foreign keys and indexes on the join
+# columns of result, race, series and standing,
+# plus partial indexes on the is_active flags.
+
+revision = 1
+description = 'Foreign keys and indexes on join columns'
+
+# indexes are built concurrently, outside of a transaction
+transactional = False
+
+FOREIGN_KEYS = [
+    ('race', 'series_id', 'series'),
+    ('result', 'race_id', 'race'),
+    ('result', 'racer_id', 'racer'),
+    ('result', 'series_id', 'series'),
+    ('series', 'winner_id', 'racer'),
+    ('standing', 'series_id', 'series'),
+    ('standing', 'racer_id', 'racer'),
+]
+
+INDEXES = [
+    ('ix_result_series_id_racer_id', 'result', 'series_id, racer_id', None),
+    ('ix_result_race_id', 'result', 'race_id', None),
+    ('ix_result_racer_id', 'result', 'racer_id', None),
+    ('ix_race_series_id', 'race', 'series_id', None),
+    ('ix_racer_active', 'racer', 'name', 'is_active'),
+    ('ix_series_active', 'series', 'id', 'is_active'),
+    ('ix_email_active', 'email', 'id', 'is_active'),
+    ('ix_video_active', 'video', 'id', 'is_active'),
+    ('ix_video_include_media', 'video', 'groupname, name', 'include_media'),
+]
+
+
+def upgrade(op):
+    for table, column, references in FOREIGN_KEYS:
+        op.addForeignKey(table, column, references)
+
+    for name, table, columns, where in INDEXES:
+        op.createIndex(name, table, columns, where=where)
+
+
+def downgrade(op):
+    for name, _, _, _ in INDEXES:
+        op.dropIndex(name)
+
+    for table, column, _ in FOREIGN_KEYS:
+        op.dropForeignKey(table, column)
@@ -0,0 +1,24 @@
+# v0002_video_unique_name.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Makes (groupname, name) unique on video so that
+# addVideo can upsert with ON CONFLICT instead of
+# checking for the video first. Duplicates left by
+# that check are reported before the index is built
+# (see Operations.findDuplicates).
+
+revision = 2
+description = 'Unique index on video groupname and name'
+
+# the index is built concurrently, outside of a transaction
+transactional = False
+
+
+def upgrade(op):
+    op.createIndex('ix_video_groupname_name', 'video', 'groupname, name',
+                   unique=True)
+
+
+def downgrade(op):
+    op.dropIndex('ix_video_groupname_name')
@@ -0,0 +1,78 @@
+# v0003_fill_standings.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Fills the pre-aggregated standing and
+# standing_history tables from the result table, so
+# an existing database shows its wins and progress
+# chart straight after the upgrade. A new database
+# starts with both tables in step with its results.
+
+revision = 3
+description = 'Fill standing and standing_history from result'
+
+TABLES = ['standing', 'standing_history']
+
+
+def upgrade(op):
+    from ..conditional import conditional
+    from ..models import db
+
+    # bootstrap creates them, `upgrade` on its own may not have
+    for table in TABLES:
+        db.Model.metadata.tables[table].create(bind=db.session.connection(),
+                                               checkfirst=True)
+
+    op.execute('''
+DELETE FROM
+    standing;
+''')
+    op.execute('''
+INSERT INTO
+    standing (series_id, racer_id, wins)
+SELECT
+    result.series_id,
+    result.racer_id,
+    COUNT(*)
+FROM
+    result
+GROUP BY
+    result.series_id,
+    result.racer_id;
+''')
+    op.execute('''
+DELETE FROM
+    standing_history;
+''')
+    op.execute('''
+INSERT INTO
+    standing_history (series_id, racer_id, race_number, wins)
+SELECT
+    result.series_id,
+    result.racer_id,
+    race.number,
+    SUM(COUNT(*)) OVER (
+        PARTITION BY
+            result.series_id,
+            result.racer_id
+        ORDER BY
+            race.number
+    )
+FROM
+    result
+JOIN
+    race ON race.id=result.race_id
+GROUP BY
+    result.series_id,
+    result.racer_id,
+    race.number;
+''')
+    # cached pages keyed on the old versions showed no wins
+    conditional.bump(*TABLES)
+    op.log('Filled standing and standing_history from result')
+
+
+def downgrade(op):
+    # the tables are kept up to date by addResult/deleteResult either
+    # way, there is nothing to undo
+    pass
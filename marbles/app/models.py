@@ -15,10 +15,17 @@ login_manager = LoginManager()
 
 @login_manager.user_loader
 def load_user(admin_id):
-    return Admin.query.filter_by(id=admin_id).first()
+    from .db_connector import loadAdmin
+    return loadAdmin(db, admin_id)
 
 
 class Racer(db.Model):
+    __table_args__ = (
+        db.Index('ix_racer_active', 'name',
+                 postgresql_where=db.text('is_active'),
+                 sqlite_where=db.text('is_active')),
+    )
+
     id = db.Column(
         db.Integer,
         primary_key=True
@@ -63,6 +70,12 @@ class Racer(db.Model):
 
 
 class Series(db.Model):
+    __table_args__ = (
+        db.Index('ix_series_active', 'id',
+                 postgresql_where=db.text('is_active'),
+                 sqlite_where=db.text('is_active')),
+    )
+
     id = db.Column(
         db.Integer,
         primary_key=True
@@ -75,7 +88,8 @@ class Series(db.Model):
     )
 
     winner_id = db.Column(
-        db.Integer
+        db.Integer,
+        db.ForeignKey('racer.id')
     )
 
     is_active = db.Column(
@@ -87,6 +101,8 @@ class Series(db.Model):
         db.Date
     )
 
+    winner = db.relationship('Racer')
+
     def __init__(self, name, winner_id=False, is_active=True):
         from datetime import date
         self.name = name.title()
@@ -103,6 +119,10 @@ class Series(db.Model):
 
 
 class Race(db.Model):
+    __table_args__ = (
+        db.Index('ix_race_series_id', 'series_id'),
+    )
+
     id = db.Column(
         db.Integer,
         primary_key=True
@@ -120,9 +140,12 @@ class Race(db.Model):
     )
 
     series_id = db.Column(
-        db.Integer
+        db.Integer,
+        db.ForeignKey('series.id')
     )
 
+    series = db.relationship('Series')
+
     def __init__(self, number, date, series_id):
         self.number = number
         self.date = date
@@ -133,23 +156,36 @@ class Race(db.Model):
 
 
 class Result(db.Model):
+    __table_args__ = (
+        db.Index('ix_result_series_id_racer_id', 'series_id', 'racer_id'),
+        db.Index('ix_result_race_id', 'race_id'),
+        db.Index('ix_result_racer_id', 'racer_id'),
+    )
+
     id = db.Column(
         db.Integer,
         primary_key=True
     )
 
     race_id = db.Column(
-        db.Integer
+        db.Integer,
+        db.ForeignKey('race.id')
     )
 
     racer_id = db.Column(
-        db.Integer
+        db.Integer,
+        db.ForeignKey('racer.id')
     )
 
     series_id = db.Column(
-        db.Integer
+        db.Integer,
+        db.ForeignKey('series.id')
     )
 
+    race = db.relationship('Race')
+    racer = db.relationship('Racer')
+    series = db.relationship('Series')
+
     def __init__(self, race_id, racer_id, series_id):
         self.race_id = race_id
         self.racer_id = racer_id
@@ -159,6 +195,73 @@ class Result(db.Model):
         return f'Race ID: {self.race_id}  Racer ID: {self.racer_id}'
 
 
+class Standing(db.Model):
+    series_id = db.Column(
+        db.Integer,
+        db.ForeignKey('series.id'),
+        primary_key=True
+    )
+
+    racer_id = db.Column(
+        db.Integer,
+        db.ForeignKey('racer.id'),
+        primary_key=True
+    )
+
+    wins = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0
+    )
+
+    def __init__(self, series_id, racer_id, wins=0):
+        self.series_id = series_id
+        self.racer_id = racer_id
+        self.wins = wins
+
+    def __repr__(self):
+        return f'Series ID: {self.series_id}  Racer ID: {self.racer_id}'
+
+
+class StandingHistory(db.Model):
+    '''
+    A racer's cumulative wins in a series as of each race they won. Rows
+    are only written when the count changes, so the count after any
+    other race is the one from the racer's latest earlier row.
+    '''
+    series_id = db.Column(
+        db.Integer,
+        db.ForeignKey('series.id'),
+        primary_key=True
+    )
+
+    racer_id = db.Column(
+        db.Integer,
+        db.ForeignKey('racer.id'),
+        primary_key=True
+    )
+
+    race_number = db.Column(
+        db.Integer,
+        primary_key=True
+    )
+
+    wins = db.Column(
+        db.Integer,
+        nullable=False
+    )
+
+    def __init__(self, series_id, racer_id, race_number, wins):
+        self.series_id = series_id
+        self.racer_id = racer_id
+        self.race_number = race_number
+        self.wins = wins
+
+    def __repr__(self):
+        return (f'Series ID: {self.series_id}  Racer ID: {self.racer_id}  '
+                f'Race: {self.race_number}')
+
+
 class Admin(db.Model):
     id = db.Column(
         db.Integer,
@@ -226,6 +329,12 @@ class Admin(db.Model):
 
 
 class Email(db.Model):
+    __table_args__ = (
+        db.Index('ix_email_active', 'id',
+                 postgresql_where=db.text('is_active'),
+                 sqlite_where=db.text('is_active')),
+    )
+
     id = db.Column(
         db.Integer,
         primary_key=True
@@ -263,6 +372,17 @@ class Email(db.Model):
 
 
 class Video(db.Model):
+    __table_args__ = (
+        db.Index('ix_video_active', 'id',
+                 postgresql_where=db.text('is_active'),
+                 sqlite_where=db.text('is_active')),
+        db.Index('ix_video_include_media', 'groupname', 'name',
+                 postgresql_where=db.text('include_media'),
+                 sqlite_where=db.text('include_media')),
+        db.Index('ix_video_groupname_name', 'groupname', 'name',
+                 unique=True),
+    )
+
     id = db.Column(
         db.Integer,
         primary_key=True
@@ -315,3 +435,147 @@ class Video(db.Model):
 
     def __repr__(self):
         return f'Video: {self.groupname} - {self.name}'
+
+
+class Outbox(db.Model):
+    __table_args__ = (
+        db.Index('ix_outbox_status_next_attempt', 'status', 'next_attempt'),
+    )
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True
+    )
+
+    recipient = db.Column(
+        db.String(80),
+        nullable=False
+    )
+
+    subject = db.Column(
+        db.String,
+        nullable=False
+    )
+
+    content = db.Column(
+        db.Text,
+        nullable=False
+    )
+
+    status = db.Column(
+        db.String(10),
+        nullable=False
+    )
+
+    attempts = db.Column(
+        db.Integer,
+        nullable=False
+    )
+
+    next_attempt = db.Column(
+        db.DateTime,
+        nullable=False
+    )
+
+    last_error = db.Column(
+        db.String
+    )
+
+    created_date = db.Column(
+        db.DateTime,
+        nullable=False
+    )
+
+    sent_date = db.Column(
+        db.DateTime
+    )
+
+    def __init__(self, recipient, subject, content):
+        from datetime import datetime
+        self.recipient = recipient
+        self.subject = subject
+        self.content = content
+        self.status = 'pending'
+        self.attempts = 0
+        self.created_date = datetime.utcnow()
+        self.next_attempt = self.created_date
+
+    def __repr__(self):
+        return f'Outbox: {self.recipient} - {self.status}'
+
+
+class WebSession(db.Model):
+    '''
+    Server-side session data for SESSION_BACKEND=db, see app/sessions.py
+    '''
+    __table_args__ = (
+        db.Index('ix_web_session_expires', 'expires'),
+    )
+
+    id = db.Column(
+        db.String(64),
+        primary_key=True
+    )
+
+    data = db.Column(
+        db.Text,
+        nullable=False
+    )
+
+    expires = db.Column(
+        db.DateTime,
+        nullable=False
+    )
+
+    def __repr__(self):
+        return f'WebSession: {self.id[:8]} - {self.expires}'
+
+
+class DataVersion(db.Model):
+    '''
+    Single row counting the committed changes to public data, see
+    app/conditional.py
+    '''
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True
+    )
+
+    version = db.Column(
+        db.BigInteger,
+        nullable=False
+    )
+
+    updated_date = db.Column(
+        db.DateTime,
+        nullable=False
+    )
+
+    def __repr__(self):
+        return f'DataVersion: {self.version} - {self.updated_date}'
+
+
+class TableVersion(db.Model):
+    '''
+    Count of the committed changes to one table, see app/conditional.py
+    and app/fragments.py
+    '''
+
+    name = db.Column(
+        db.String(32),
+        primary_key=True
+    )
+
+    version = db.Column(
+        db.BigInteger,
+        nullable=False
+    )
+
+    updated_date = db.Column(
+        db.DateTime,
+        nullable=False
+    )
+
+    def __repr__(self):
+        return f'TableVersion: {self.name} - {self.version}'
@@ -0,0 +1,107 @@
+# profiler.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Counts and times every SQL statement issued while
+# handling a request. The totals are sent back in a
+# Server-Timing header and logged, and any statement
+# slower than SLOW_QUERY_MS is logged on its own.
+
+from time import perf_counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class RequestStats:
+    '''
+    SQL statements issued while handling a single request.
+    '''
+
+    def __init__(self, keep):
+        self.started = perf_counter()
+        self.count = 0
+        self.dbTime = 0.0
+        self.keep = keep
+        self.slowest = []
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.dbTime += elapsed
+        self.slowest.append((elapsed, statement))
+        self.slowest.sort(key=lambda entry: entry[0], reverse=True)
+        del self.slowest[self.keep:]
+
+
+class QueryProfiler:
+    '''
+    Hooks SQLAlchemy's before/after_cursor_execute events. Call
+    init_app() from the app factory; PROFILE_QUERIES turns it off.
+    '''
+
+    def __init__(self):
+        self.app = None
+        self.slowQuery = None
+
+    def init_app(self, app):
+        if not app.config['PROFILE_QUERIES']:
+            return
+
+        self.app = app
+        self.slowQuery = app.config['SLOW_QUERY_MS'] / 1000
+        self.keep = app.config['PROFILE_SLOWEST']
+        if not event.contains(Engine, 'before_cursor_execute',
+                              self.before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute',
+                         self.before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute',
+                         self.after_cursor_execute)
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters,
+                              context, executemany):
+        conn.info.setdefault('query_started', []).append(perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters,
+                             context, executemany):
+        elapsed = perf_counter() - conn.info['query_started'].pop()
+        stats = g.get('queryStats') if has_request_context() else None
+        if stats is not None:
+            stats.record(statement, elapsed)
+
+        if elapsed >= self.slowQuery:
+            where = f' in {request.method} {request.path}' \
+                if has_request_context() else ''
+            self.app.logger.warning(
+                f'Slow query ({elapsed * 1000:.1f}ms){where}: '
+                f'{" ".join(statement.split())}')
+
+    def before_request(self):
+        g.queryStats = RequestStats(self.keep)
+
+    def after_request(self, response):
+        stats = g.get('queryStats')
+        if stats is None:
+            return response
+
+        total = perf_counter() - stats.started
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={stats.dbTime * 1000:.1f};'
+            f'desc="{stats.count} queries"')
+        response.headers.add('Server-Timing',
+                             f'total;dur={total * 1000:.1f}')
+
+        self.app.logger.info(
+            f'{request.method} {request.path} {response.status_code}: '
+            f'{stats.count} queries in {stats.dbTime * 1000:.1f}ms of '
+            f'{total * 1000:.1f}ms')
+        for elapsed, statement in stats.slowest:
+            self.app.logger.debug(
+                f'  {elapsed * 1000:.1f}ms: {" ".join(statement.split())}')
+        return response
+
+
+profiler = QueryProfiler()
@@ -0,0 +1,152 @@
+# publisher.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Publish mode. With PUBLISH_DIR set, the public
+# pages (and the first page of each public data
+# table) are rendered to static files that nginx
+# serves to anonymous visitors without touching the
+# app. They are rendered again in the background
+# after every change to the data version, and the
+# dynamic routes stay in place as the fallback.
+
+from os import makedirs, replace
+from os.path import dirname, join
+from secrets import token_urlsafe
+from threading import Event, Lock, Thread
+from time import sleep
+
+from flask import g
+
+PAGES = ['/', '/data', '/media', '/about', '/info']
+
+# set on sign-in so nginx sends signed in admins to the app
+ADMIN_COOKIE = 'marbles_admin'
+
+
+class Publisher:
+    '''
+    Renders the public pages to PUBLISH_DIR. Call init_app() from the app
+    factory; nothing is published while PUBLISH_DIR is empty.
+    '''
+
+    def __init__(self):
+        self.app = None
+        self.db = None
+        self.directory = ''
+        self.pending = Event()
+        self.lock = Lock()
+        self.thread = None
+
+    def init_app(self, app, db):
+        self.app = app
+        self.db = db
+        self.directory = app.config['PUBLISH_DIR']
+        self.delay = app.config['PUBLISH_DELAY']
+        app.context_processor(self.context)
+        if self.directory:
+            # catch up with writes (or template changes) made while no
+            # worker was running
+            app.before_first_request(self.schedule)
+
+    def context(self):
+        return {'published': g.get('publishing', False)}
+
+    def paths(self):
+        from . import PUBLIC_TABLES
+        return PAGES + [f'/tables/{table}' for table in PUBLIC_TABLES]
+
+    def schedule(self):
+        '''
+        Render the pages again soon, in a background thread. Calls made
+        while a render is waiting to start are folded into it.
+        '''
+        if not self.directory:
+            return
+        self.pending.set()
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = Thread(target=self.run, name='publish',
+                                     daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            self.pending.wait()
+            # let the rest of a burst of writes land first
+            sleep(self.delay)
+            self.pending.clear()
+            try:
+                self.publish()
+            except Exception:
+                self.app.logger.exception('Publishing pages failed')
+
+    def stamp(self):
+        try:
+            with open(join(self.directory, '.version')) as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, name, data):
+        path = join(self.directory, name)
+        makedirs(dirname(path), exist_ok=True)
+        # write then rename so nginx never serves half a page
+        partial = f'{path}.{token_urlsafe(8)}.tmp'
+        with open(partial, 'wb') as file:
+            file.write(data)
+        replace(partial, path)
+
+    def render(self, path):
+        '''
+        Render a page as an anonymous visitor would get it, without
+        saving a session for it.
+
+        Returns:
+            Response
+        '''
+        with self.app.test_request_context(path):
+            g.publishing = True
+            return self.app.make_response(self.app.dispatch_request())
+
+    def publish(self, force=False):
+        '''
+        Render every published page, unless the files already match the
+        current data version and templates.
+
+        Args:
+            force (bool): Set True to render them anyway
+
+        Returns:
+            int - number of files written
+        '''
+        from .conditional import conditional
+
+        with self.app.app_context():
+            try:
+                # taken before rendering, so a write that lands meanwhile
+                # is published again
+                stamp = f'{conditional.build}:{conditional.load()["version"]}'
+                if not force and self.stamp() == stamp:
+                    return 0
+                written = 0
+                for path in self.paths():
+                    response = self.render(path)
+                    if response.status_code != 200:
+                        self.app.logger.warning(
+                            f'Not publishing {path}: {response.status}')
+                        continue
+                    extension = ('json' if response.mimetype ==
+                                 'application/json' else 'html')
+                    self.write(f'{path.strip("/") or "index"}.{extension}',
+                               response.get_data())
+                    written += 1
+                self.write('.version', stamp.encode())
+                return written
+            finally:
+                self.db.session.remove()
+
+
+publisher = Publisher()
@@ -0,0 +1,182 @@
+# registry.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Reference tables (racers, series and videos) shared
+# by the admin forms and routes. Each table is loaded
+# at most once per request, and with REGISTRY_TTL set
+# its rows are also kept in the application cache
+# between requests, keyed on the table's version so
+# a commit on any worker moves every worker on to a
+# fresh copy.
+
+from datetime import date, datetime
+
+from flask import g, has_app_context
+
+REGISTRY_KEY = 'registry:{}:{}'
+
+# table_version name of each registry table
+TABLES = {'racers': 'racer', 'series': 'series', 'videos': 'video'}
+
+
+def snapshot(row, exclude=()):
+    '''
+    Copy a model's column values into a JSON serializable dict.
+
+    Args:
+        row (db.Model): Loaded model object
+        exclude (list(str)): Columns to leave out
+
+    Returns:
+        dict
+    '''
+    values = {}
+    for column in row.__table__.columns:
+        if column.key in exclude:
+            continue
+        value = getattr(row, column.key)
+        if isinstance(value, (date, datetime)):
+            value = value.isoformat()
+        values[column.key] = value
+    return values
+
+
+def restore(db, model, values):
+    '''
+    Rebuild a model object from a snapshot and attach it to the session
+    as if it had just been loaded, without a query. Columns missing from
+    the snapshot are loaded from the db if something reads them.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+        model (db.Model): Model the snapshot was taken from
+        values (dict): Values returned by snapshot()
+
+    Returns:
+        db.Model
+    '''
+    from sqlalchemy import Date, DateTime
+    from sqlalchemy.orm import make_transient_to_detached
+
+    row = model.__mapper__.class_manager.new_instance()
+    for column in model.__table__.columns:
+        if column.key not in values:
+            continue
+        value = values[column.key]
+        if value is not None and isinstance(column.type, DateTime):
+            value = datetime.fromisoformat(value)
+        elif value is not None and isinstance(column.type, Date):
+            value = date.fromisoformat(value)
+        setattr(row, column.key, value)
+    make_transient_to_detached(row)
+    return db.session.merge(row, load=False)
+
+
+class Registry:
+    '''
+    Per-request registry of reference rows. Call init_app() from the app
+    factory; REGISTRY_TTL = 0 keeps rows for a single request only.
+    '''
+
+    def __init__(self):
+        self.ttl = 0
+
+    def init_app(self, app):
+        self.ttl = app.config['REGISTRY_TTL']
+
+    def query(self, table):
+        from .models import Racer, Series, Video
+
+        if table == 'racers':
+            return Racer, Racer.query.order_by(Racer.name.asc())
+        if table == 'series':
+            return Series, Series.query.order_by(Series.id.asc())
+        if table == 'videos':
+            return Video, Video.query.order_by(Video.groupname.asc(),
+                                               Video.name.asc())
+        raise ValueError(f'Unknown registry table: {table}')
+
+    def load(self, table):
+        from .cache import cache
+        from .models import db
+
+        from .conditional import conditional
+
+        model, query = self.query(table)
+        # a write to the table that hasn't committed yet isn't in any
+        # cached copy, and must not be cached under the old version
+        pending = db.session.info.get('data_version', ())
+        if not self.ttl or TABLES[table] in pending:
+            return query.all()
+
+        version = conditional.current()['tables'].get(TABLES[table], 0)
+        key = REGISTRY_KEY.format(table, version)
+        values = cache.get(key)
+        if values is None:
+            rows = query.all()
+            cache.set(key, [snapshot(row) for row in rows], self.ttl)
+            return rows
+        return [restore(db, model, row) for row in values]
+
+    def get(self, table):
+        '''
+        Args:
+            table (str): racers, series or videos
+
+        Returns:
+            list(db.Model) - every row of the table
+        '''
+        if not has_app_context():
+            return self.load(table)
+        loaded = g.setdefault('registry', {})
+        if table not in loaded:
+            loaded[table] = self.load(table)
+        return loaded[table]
+
+    def find(self, table, id):
+        '''
+        Returns:
+            db.Model - the row with the given id, or None
+        '''
+        return next((row for row in self.get(table) if row.id == int(id)),
+                    None)
+
+    def racers(self):
+        return self.get('racers')
+
+    def series(self):
+        return self.get('series')
+
+    def videos(self):
+        return self.get('videos')
+
+    def activeSeries(self):
+        '''
+        Returns:
+            Series - the active series, or a placeholder like
+            getSeries(active=True)
+        '''
+        from .models import Series
+        active = next((series for series in self.series()
+                       if series.is_active), None)
+        if active is None:
+            return Series('- No Active Series Available -', is_active=True)
+        return active
+
+    def activeVideo(self):
+        return next((video for video in self.videos() if video.is_active),
+                    None)
+
+    def invalidate(self, *tables):
+        '''
+        Forget the given tables for the rest of this request. Cached
+        copies are left alone: the write bumps the table's version, so
+        they stop being read once it commits.
+        '''
+        if has_app_context():
+            for table in tables:
+                g.get('registry', {}).pop(table, None)
+
+
+registry = Registry()
@@ -0,0 +1,281 @@
+# sessions.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Server-side session store. The cookie only carries
+# a random session id and the session data is kept in
+# the db (or in files on a shared volume), so every
+# gunicorn worker and every app container behind
+# nginx sees the same signed in admin. Expired
+# sessions are swept every SESSION_SWEEP_INTERVAL.
+
+import re
+from datetime import datetime
+from os import makedirs, remove, replace, scandir, stat, utime
+from os.path import join
+from secrets import token_urlsafe
+from threading import Lock
+from time import monotonic, time
+
+from flask.sessions import (SecureCookieSession, SessionInterface,
+                            session_json_serializer)
+from sqlalchemy import text
+
+SESSION_ID = re.compile(r'[A-Za-z0-9_-]{43}')
+
+
+class DatabaseStore:
+    '''
+    Keeps sessions in the web_session table. Every call runs in its own
+    short transaction so it never commits the request's own work on
+    db.session.
+    '''
+
+    def __init__(self, db):
+        self.db = db
+
+    def release(self):
+        '''
+        Hand the request's db.session connection back to the pool before
+        checking out another one to save the session. The request is over
+        by then, and teardown would roll back anything left uncommitted
+        anyway. Otherwise each request saving a session holds one
+        connection while waiting for a second, and a busy pool stalls.
+        '''
+        self.db.session.remove()
+
+    def load(self, sid):
+        with self.db.engine.connect() as connection:
+            return connection.execute(text('''
+SELECT
+    data
+FROM
+    web_session
+WHERE
+    id=:id
+    AND expires > :now;
+'''), {'id': sid, 'now': datetime.utcnow()}).scalar()
+
+    def save(self, sid, data, expires):
+        self.release()
+        with self.db.engine.begin() as connection:
+            connection.execute(text('''
+INSERT INTO
+    web_session (id, data, expires)
+VALUES
+    (:id, :data, :expires)
+ON CONFLICT (id) DO UPDATE SET
+    data=EXCLUDED.data,
+    expires=EXCLUDED.expires;
+'''), {'id': sid, 'data': data, 'expires': expires})
+
+    def delete(self, sid):
+        self.release()
+        with self.db.engine.begin() as connection:
+            connection.execute(text('''
+DELETE FROM
+    web_session
+WHERE
+    id=:id;
+'''), {'id': sid})
+
+    def sweep(self):
+        with self.db.engine.begin() as connection:
+            return connection.execute(text('''
+DELETE FROM
+    web_session
+WHERE
+    expires <= :now;
+'''), {'now': datetime.utcnow()}).rowcount
+
+
+class FileStore:
+    '''
+    Keeps one file per session in a directory, with the file's mtime set
+    to when it expires. Point SESSION_FILE_DIR at a volume shared by every
+    app container when running more than one.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        makedirs(directory, exist_ok=True)
+
+    def path(self, sid):
+        return join(self.directory, sid)
+
+    def load(self, sid):
+        try:
+            if stat(self.path(sid)).st_mtime <= time():
+                return None
+            with open(self.path(sid)) as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def save(self, sid, data, expires):
+        # write then rename so a concurrent load never reads half a file
+        partial = f'{self.path(sid)}.{token_urlsafe(8)}.tmp'
+        with open(partial, 'w') as file:
+            file.write(data)
+        expires = (expires - datetime(1970, 1, 1)).total_seconds()
+        utime(partial, (expires, expires))
+        replace(partial, self.path(sid))
+
+    def delete(self, sid):
+        try:
+            remove(self.path(sid))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self):
+        now = time()
+        swept = 0
+        with scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    expires = entry.stat().st_mtime
+                    if not SESSION_ID.fullmatch(entry.name):
+                        # a .tmp file still being written by save()
+                        expires += 3600
+                    if expires <= now:
+                        remove(entry.path)
+                        swept += 1
+                except FileNotFoundError:
+                    # already swept by another worker
+                    pass
+        return swept
+
+
+class ServerSession(SecureCookieSession):
+    '''
+    Session data loaded from the store, tracking whether it was accessed
+    or modified just like Flask's cookie session.
+    '''
+
+    def __init__(self, initial=None, sid=None, new=False):
+        super().__init__(initial)
+        self.sid = sid
+        self.new = new
+        self.previous = None
+
+    def regenerate(self):
+        '''
+        Move the session's data to a new id, dropping the old one from the
+        store when the response is saved.
+        '''
+        if not self.new and self.previous is None:
+            self.previous = self.sid
+        self.sid = token_urlsafe(32)
+        self.modified = True
+
+
+class ServerSessionInterface(SessionInterface):
+    '''
+    Flask session interface that keeps only the session id in the cookie.
+    Session ids the store doesn't know about are never reused, so a
+    visitor can't pick their own, and the id is replaced on sign-in and
+    logout (see Sessions.regenerate), so one planted in an admin's browser
+    beforehand is never signed in.
+    '''
+
+    serializer = session_json_serializer
+
+    def __init__(self, store, sweepInterval):
+        self.store = store
+        self.sweepInterval = sweepInterval
+        self.lastSweep = monotonic()
+        self.lock = Lock()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(app.session_cookie_name)
+        if sid and SESSION_ID.fullmatch(sid):
+            data = self.store.load(sid)
+            if data is not None:
+                return ServerSession(self.serializer.loads(data), sid=sid)
+        return ServerSession(sid=token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.previous is not None:
+            self.store.delete(session.previous)
+            session.previous = None
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(app.session_cookie_name,
+                                       domain=domain, path=path)
+            return
+
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not self.should_set_cookie(app, session):
+            return
+
+        self.store.save(session.sid, self.serializer.dumps(dict(session)),
+                        datetime.utcnow() + app.permanent_session_lifetime)
+        response.set_cookie(
+            app.session_cookie_name, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app), domain=domain,
+            path=path, secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app))
+        self.maybeSweep(app)
+
+    def maybeSweep(self, app):
+        with self.lock:
+            if monotonic() - self.lastSweep < self.sweepInterval:
+                return
+            self.lastSweep = monotonic()
+        swept = self.store.sweep()
+        if swept:
+            app.logger.info(f'Swept {swept} expired session(s)')
+
+
+class Sessions:
+    '''
+    Call init_app() from the app factory to swap Flask's signed cookie
+    session for the store configured by SESSION_BACKEND.
+    '''
+
+    def __init__(self):
+        self.interface = None
+
+    def init_app(self, app, db):
+        backend = app.config['SESSION_BACKEND']
+        if backend == 'db':
+            store = DatabaseStore(db)
+        elif backend == 'file':
+            store = FileStore(app.config['SESSION_FILE_DIR'])
+        elif backend == 'cookie':
+            return
+        else:
+            raise ValueError(f'Unknown SESSION_BACKEND: {backend}')
+        self.interface = ServerSessionInterface(
+            store, app.config['SESSION_SWEEP_INTERVAL'])
+        app.session_interface = self.interface
+
+    def regenerate(self):
+        '''
+        Give the current session a new id, keeping its data. Call right
+        after login_user() and logout_user(). Flask's cookie session has
+        no id to replace.
+        '''
+        from flask import session
+        current = session._get_current_object()
+        if isinstance(current, ServerSession):
+            current.regenerate()
+
+    def sweep(self):
+        '''
+        Returns:
+            int - number of expired sessions removed
+        '''
+        if self.interface is None:
+            return 0
+        return self.interface.store.sweep()
+
+
+sessions = Sessions()
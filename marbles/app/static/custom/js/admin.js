@@ -0,0 +1,59 @@
+// Fills the admin page's form choices and lists. Every
+// element with a data-section is filled from that
+// section's JSON (/admin/sections/<section>) the first
+// time the modal holding it is opened, so the page
+// itself renders without loading racers, series or
+// videos.
+
+var adminSections = {};
+
+function loadAdminSection(section) {
+    if (!adminSections[section]) {
+        adminSections[section] = fetch('/admin/sections/' + section, {
+            credentials: 'same-origin'
+        }).then(function (response) {
+            return response.json();
+        });
+    }
+    return adminSections[section];
+}
+
+function fillAdminElement(element, data) {
+    var value = data[element.dataset.field];
+    if (element.tagName === 'SELECT') {
+        // a re-rendered submission already has its choices
+        if (element.options.length === 0) {
+            value.forEach(function (row) {
+                element.add(new Option(row.label, row.id));
+            });
+        }
+    } else if (element.tagName === 'DATALIST') {
+        if (element.children.length === 0) {
+            value.forEach(function (item) {
+                var option = document.createElement('option');
+                option.value = item.label || item;
+                element.appendChild(option);
+            });
+        }
+    } else if (element.tagName === 'INPUT') {
+        if (!element.value) {
+            element.value = value;
+        }
+    } else {
+        element.textContent = value;
+    }
+}
+
+function fillAdminSections(container) {
+    container.querySelectorAll('[data-section]').forEach(function (element) {
+        loadAdminSection(element.dataset.section).then(function (data) {
+            fillAdminElement(element, data);
+        });
+    });
+}
+
+$(function () {
+    $('.modal').one('show.bs.modal', function () {
+        fillAdminSections(this);
+    });
+});
@@ -0,0 +1,26 @@
+// Published pages are static files shared by every
+// visitor, so their forms carry an empty CSRF token.
+// It is fetched for this visitor's session the first
+// time the modal holding the form is opened.
+
+function fillCsrfTokens(container) {
+    var inputs = container.querySelectorAll('[data-csrf]');
+    if (inputs.length === 0) {
+        return;
+    }
+    fetch('/csrf-token', {
+        credentials: 'same-origin'
+    }).then(function (response) {
+        return response.json();
+    }).then(function (data) {
+        inputs.forEach(function (input) {
+            input.value = data.csrf_token;
+        });
+    });
+}
+
+$(function () {
+    $('.modal').one('show.bs.modal', function () {
+        fillCsrfTokens(this);
+    });
+});
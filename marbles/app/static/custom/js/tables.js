@@ -0,0 +1,84 @@
+// Loads the server-side paginated data tables. Each
+// container with a data-table-endpoint is fetched the
+// first time its tab is shown, then re-fetched as the
+// visitor sorts, searches or pages through it.
+
+function initDataTable(container) {
+    var state = { sort: '', order: '', search: '', after: '', history: [] };
+
+    function load() {
+        var params = new URLSearchParams();
+        ['sort', 'order', 'search', 'after'].forEach(function (name) {
+            if (state[name]) {
+                params.set(name, state[name]);
+            }
+        });
+        fetch(container.dataset.tableEndpoint + '?' + params.toString(), {
+            credentials: 'same-origin'
+        }).then(function (response) {
+            return response.json();
+        }).then(function (page) {
+            container.innerHTML = page.html;
+            state.sort = page.sort;
+            state.order = page.order;
+            var prev = container.querySelector('[data-page="prev"]');
+            if (prev) {
+                prev.disabled = state.history.length === 0;
+            }
+        });
+    }
+
+    container.addEventListener('click', function (event) {
+        var sort = event.target.closest('[data-sort]');
+        var page = event.target.closest('[data-page]');
+        if (sort) {
+            event.preventDefault();
+            if (state.sort === sort.dataset.sort) {
+                state.order = state.order === 'asc' ? 'desc' : 'asc';
+            } else {
+                state.sort = sort.dataset.sort;
+                state.order = 'asc';
+            }
+            state.after = '';
+            state.history = [];
+            load();
+        } else if (page && page.dataset.page === 'next') {
+            state.history.push(state.after);
+            state.after = page.dataset.cursor;
+            load();
+        } else if (page && page.dataset.page === 'prev') {
+            state.after = state.history.pop() || '';
+            load();
+        }
+    });
+
+    container.addEventListener('submit', function (event) {
+        event.preventDefault();
+        state.search = event.target.elements.search.value;
+        state.after = '';
+        state.history = [];
+        load();
+    });
+
+    load();
+}
+
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('.tab-pane').forEach(function (pane) {
+        var container = pane.querySelector('[data-table-endpoint]');
+        if (!container) {
+            return;
+        }
+        if (pane.classList.contains('active')) {
+            initDataTable(container);
+            return;
+        }
+        var tab = document.querySelector('[href="#' + pane.id + '"]');
+        tab.addEventListener('click', function () {
+            if (!container.dataset.loaded) {
+                container.dataset.loaded = 'true';
+                initDataTable(container);
+            }
+        });
+    });
+});
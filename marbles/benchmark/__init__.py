@@ -0,0 +1,11 @@
+# benchmark/__init__.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Benchmarks for the public and admin routes. Seed a
+# synthetic dataset, drive the routes and write a JSON
+# baseline that can be compared between commits:
+#
+#   python -m benchmark seed --races 20000
+#   python -m benchmark run --output before.json
+#   python -m benchmark compare before.json after.json
@@ -0,0 +1,121 @@
+# benchmark/__main__.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Command line entry point: `python -m benchmark ...`
+# run from the marbles directory with the usual env.
+
+import json
+
+import click
+
+from app.datagen import WINNERS
+
+from .report import compare, countRows, writeBaseline
+from .runner import ROUTES, runClient, runHttp
+from .seed import seed
+
+
+@click.group()
+def benchmark():
+    '''
+    Benchmark the Marble Race routes.
+    '''
+
+
+@benchmark.command('seed')
+@click.option('--racers', default=20, show_default=True)
+@click.option('--series', default=10, show_default=True)
+@click.option('--races', default=20000, show_default=True)
+@click.option('--subscribers', default=1000, show_default=True)
+@click.option('--videos', default=20, show_default=True)
+@click.option('--winners', type=click.Choice(WINNERS), default='uniform',
+              show_default=True)
+@click.option('--random-seed', default=0, show_default=True)
+def seed_command(racers, series, races, subscribers, videos, winners,
+                 random_seed):
+    '''
+    Add a synthetic dataset to the configured db. Use a scratch db, this
+    also creates a `benchmark` admin.
+    '''
+    from app import create_app
+    from app.models import db
+
+    app = create_app()
+    with app.app_context():
+        added = seed(db, racers=racers, series=series, races=races,
+                     subscribers=subscribers, videos=videos,
+                     winners=winners, seed=random_seed)
+    click.echo(f'Seeded {added}')
+
+
+@benchmark.command('run')
+@click.option('--mode', type=click.Choice(['client', 'http']),
+              default='client', show_default=True,
+              help='Flask test client in-process, or HTTP to --url.')
+@click.option('--url', default='http://localhost:5000', show_default=True)
+@click.option('--requests', default=200, show_default=True,
+              help='Timed requests per route.')
+@click.option('--concurrency', default=8, show_default=True,
+              help='Requests in flight at once in http mode.')
+@click.option('--route', 'only', multiple=True,
+              type=click.Choice([name for name, _, _ in ROUTES]),
+              help='Only benchmark these routes (repeatable).')
+@click.option('--output', default='benchmark.json', show_default=True)
+@click.option('--fresh', is_flag=True,
+              help='Create and seed the db in this process first, as an '
+                   'in-memory sqlite db (config.TestConfig) needs.')
+def run_command(mode, url, requests, concurrency, only, output, fresh):
+    '''
+    Benchmark the routes and write a JSON baseline.
+    '''
+    from app import create_app
+    from app.migrations import stamp
+    from app.models import db
+
+    routes = [route for route in ROUTES if not only or route[0] in only]
+    app = create_app()
+    with app.app_context():
+        if fresh:
+            db.create_all()
+            stamp(db)
+            seed(db)
+        dataset = countRows(db)
+        db.session.remove()
+    if mode == 'client':
+        results = runClient(app, routes, requests=requests)
+    else:
+        results = runHttp(url, routes, requests=requests,
+                          concurrency=concurrency)
+
+    writeBaseline(output, results, mode, dataset, requests=requests,
+                  concurrency=concurrency if mode == 'http' else 1)
+    click.echo(f"{'route':<16}{'p50':>9}{'p95':>9}{'p99':>9}"
+               f"{'queries':>9}{'KB':>9}{'errors':>8}")
+    for name, summary in results.items():
+        click.echo(f"{name:<16}{summary['p50']:>9}{summary['p95']:>9}"
+                   f"{summary['p99']:>9}{str(summary['queries']):>9}"
+                   f"{str(summary['memoryKB']):>9}{summary['errors']:>8}")
+    click.echo(f'Wrote {output}')
+
+
+@benchmark.command('compare')
+@click.argument('old', type=click.File('r'))
+@click.argument('new', type=click.File('r'))
+@click.option('--threshold', default=10.0, show_default=True,
+              help='Percentage increase reported as a regression.')
+def compare_command(old, new, threshold):
+    '''
+    Compare two baselines, exiting with 1 on any regression.
+    '''
+    lines, regressions = compare(json.load(old), json.load(new),
+                                 threshold=threshold)
+    for line in lines:
+        click.echo(line)
+    if regressions:
+        click.echo(f'{len(regressions)} regression(s) over {threshold}%')
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    benchmark()
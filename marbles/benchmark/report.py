@@ -0,0 +1,99 @@
+# benchmark/report.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Writes benchmark results to a JSON baseline and
+# compares two baselines route by route.
+
+import json
+import platform
+import subprocess
+from datetime import datetime
+
+# metrics where a higher number is a regression
+METRICS = ['p50', 'p95', 'p99', 'queries', 'memoryKB']
+
+
+def gitCommit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def countRows(db):
+    '''
+    Returns:
+        dict(str: int) - rows in the tables the routes read
+    '''
+    counts = {}
+    for table in ('racer', 'series', 'race', 'result', 'email', 'video'):
+        counts[table] = db.session.execute(
+            f'SELECT COUNT(*) FROM {table};').scalar()
+    return counts
+
+
+def writeBaseline(path, routes, mode, dataset, **settings):
+    '''
+    Save a benchmark run with enough context to compare it later.
+
+    Args:
+        path (str): JSON file to write
+        routes (dict): Summary per route name
+        mode (str): client or http
+        dataset (dict): Rows per table at the time of the run
+        settings: Run settings such as requests and concurrency
+    '''
+    baseline = {
+        'commit': gitCommit(),
+        'date': datetime.utcnow().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'mode': mode,
+        'settings': settings,
+        'dataset': dataset,
+        'routes': routes,
+    }
+    with open(path, 'w') as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+
+
+def compare(old, new, threshold=10.0):
+    '''
+    Compare two baselines.
+
+    Args:
+        old (dict): Baseline to compare against
+        new (dict): Baseline of the change being measured
+        threshold (float): Percentage increase counted as a regression
+
+    Returns:
+        tup(list(str), list(str)) - report lines and the regressions
+    '''
+    lines = [f"{'route':<16}{'metric':<10}{'old':>10}{'new':>10}"
+             f"{'change':>10}"]
+    regressions = []
+    for route, newSummary in new['routes'].items():
+        oldSummary = old['routes'].get(route)
+        if oldSummary is None:
+            lines.append(f'{route:<16}(new route)')
+            continue
+        for metric in METRICS:
+            before = oldSummary.get(metric)
+            after = newSummary.get(metric)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before * 100 if before else 0.0
+            flag = ''
+            if change > threshold:
+                flag = '  <- regression'
+                regressions.append(f'{route} {metric} {change:+.1f}%')
+            lines.append(f'{route:<16}{metric:<10}{before:>10}{after:>10}'
+                         f'{change:>+9.1f}%{flag}')
+    if old.get('dataset') != new.get('dataset'):
+        lines.append('Note: the two runs used different datasets.')
+    if (old.get('mode'), old.get('settings')) != (new.get('mode'),
+                                                  new.get('settings')):
+        lines.append('Note: the two runs used different modes or settings.')
+    return lines, regressions
@@ -0,0 +1,193 @@
+# benchmark/runner.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Drives the routes either in-process with the Flask
+# test client or over HTTP with concurrent clients,
+# and summarizes latency, queries and memory per route.
+
+import re
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from math import ceil
+from threading import local
+from time import perf_counter
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, build_opener
+
+from .seed import BENCHMARK_ADMIN
+
+# name, path and whether the route needs a signed in admin
+ROUTES = [
+    ('index', '/', False),
+    ('data', '/data', False),
+    ('media', '/media', False),
+    ('tables_races', '/tables/userFriendlyRaces', False),
+    ('tables_racers', '/tables/userFriendlyRacers', False),
+    ('tables_results', '/tables/result', True),
+    ('admin', '/admin', True),
+]
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+CSRF_TOKEN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+
+def percentile(values, pct):
+    '''
+    Nearest-rank percentile of a list of numbers.
+    '''
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def countQueries(headers):
+    '''
+    Read the query count the app reports in its Server-Timing header.
+    '''
+    match = QUERIES.search(', '.join(headers))
+    return int(match.group(1)) if match else None
+
+
+def summarize(latencies, queries, memory, errors):
+    '''
+    Returns:
+        dict - request count, errors, latency percentiles in ms, mean
+        queries per request and mean peak memory per request in KB
+    '''
+    queries = [count for count in queries if count is not None]
+    summary = {
+        'requests': len(latencies),
+        'errors': errors,
+        'mean': round(sum(latencies) / len(latencies) * 1000, 2)
+        if latencies else None,
+        'queries': round(sum(queries) / len(queries), 2)
+        if queries else None,
+        'memoryKB': round(sum(memory) / len(memory) / 1024, 1)
+        if memory else None,
+    }
+    for pct in (50, 95, 99):
+        value = percentile(latencies, pct)
+        summary[f'p{pct}'] = round(value * 1000, 2) \
+            if value is not None else None
+    return summary
+
+
+def runClient(app, routes=ROUTES, requests=200, warmup=5,
+              memorySamples=10):
+    '''
+    Benchmark the routes in-process with the Flask test client, which
+    leaves out the network and the WSGI server.
+
+    Args:
+        app (Flask): App to drive
+        routes (list(tup)): name, path and admin flag of each route
+        requests (int): Timed requests per route
+        warmup (int): Untimed requests per route first
+        memorySamples (int): Extra requests per route traced with
+            tracemalloc, kept apart from the timed ones
+
+    Returns:
+        dict(str: dict) - summary per route name
+    '''
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+    username, password = BENCHMARK_ADMIN
+    client.post('/sign-in', data={'username': username,
+                                  'password': password})
+
+    results = {}
+    for name, path, _ in routes:
+        for _ in range(warmup):
+            client.get(path)
+
+        latencies, queries, errors = [], [], 0
+        for _ in range(requests):
+            started = perf_counter()
+            response = client.get(path)
+            latencies.append(perf_counter() - started)
+            queries.append(countQueries(
+                response.headers.getlist('Server-Timing')))
+            errors += response.status_code >= 400
+
+        memory = []
+        for _ in range(memorySamples):
+            tracemalloc.start()
+            client.get(path)
+            memory.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+        results[name] = summarize(latencies, queries, memory, errors)
+    return results
+
+
+class HttpClient(local):
+    '''
+    One cookie-keeping opener per thread, signed in on first use when
+    an admin route is benchmarked.
+    '''
+
+    def __init__(self, url, signIn):
+        self.url = url
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()))
+        if signIn:
+            self.signIn()
+
+    def signIn(self):
+        page = self.opener.open(self.url + '/sign-in').read().decode()
+        username, password = BENCHMARK_ADMIN
+        form = urlencode({'csrf_token': CSRF_TOKEN.search(page).group(1),
+                          'username': username,
+                          'password': password}).encode()
+        self.opener.open(self.url + '/sign-in', form).read()
+
+    def get(self, path):
+        '''
+        Returns:
+            tup(float, int, bool) - seconds taken, queries and whether
+            the request failed
+        '''
+        started = perf_counter()
+        try:
+            with self.opener.open(self.url + path) as response:
+                response.read()
+                headers = response.headers.get_all('Server-Timing') or []
+                failed = response.status >= 400
+        except Exception:
+            return perf_counter() - started, None, True
+        return perf_counter() - started, countQueries(headers), failed
+
+
+def runHttp(url, routes=ROUTES, requests=200, concurrency=8, warmup=5):
+    '''
+    Benchmark a running server (gunicorn behind nginx, or flask run)
+    with concurrent HTTP clients. Memory can't be measured from here.
+
+    Args:
+        url (str): Base url of the server, e.g. http://localhost:5000
+        routes (list(tup)): name, path and admin flag of each route
+        requests (int): Timed requests per route
+        concurrency (int): Requests in flight at once
+        warmup (int): Untimed requests per route first
+
+    Returns:
+        dict(str: dict) - summary per route name
+    '''
+    url = url.rstrip('/')
+    signIn = any(admin for _, _, admin in routes)
+    clients = HttpClient(url, signIn)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for name, path, _ in routes:
+            list(pool.map(lambda _: clients.get(path), range(warmup)))
+            samples = list(pool.map(lambda _: clients.get(path),
+                                    range(requests)))
+            results[name] = summarize(
+                [latency for latency, _, _ in samples],
+                [queries for _, queries, _ in samples],
+                [],
+                sum(failed for _, _, failed in samples))
+    return results
@@ -0,0 +1,29 @@
+# benchmark/seed.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Fills the db with a deterministic synthetic dataset
+# of a configurable size for the benchmarks.
+
+BENCHMARK_ADMIN = ('benchmark', 'benchmark')
+
+
+def seed(db, **options):
+    '''
+    Add a generated dataset (see app.datagen.generate for the options)
+    and the admin the benchmarks sign in as.
+
+    Args:
+        db (SQLAlchemy): Flask sqlalchemy object
+
+    Returns:
+        dict - rows added per table and seconds taken
+    '''
+    from app.datagen import generate
+    from app.db_connector import addAdmin
+
+    added = generate(db, **options)
+    username, password = BENCHMARK_ADMIN
+    addAdmin(db, username, password, name='Benchmark')
+    db.session.commit()
+    return added
@@ -29,34 +29,124 @@ class Config:
         else:
             return True
 
-    # flask settings
-    SECRET_KEY = urandom(32)
-    FLASK_APP = environ['FLASK_APP']
-    FLASK_ENV = environ['FLASK_ENV']
-    FLASK_DEBUG = environ['FLASK_DEBUG']
-    FLASK_HOST = environ['FLASK_HOST']
-    FLASK_PORT = environ['FLASK_PORT']
+    # flask settings - set SECRET_KEY (in secrets.env) to the same value
+    # for every worker and app container, otherwise each one signs its own
+    # session cookies and CSRF tokens and rejects everyone else's
+    SECRET_KEY = environ.get('SECRET_KEY') or urandom(32)
+    FLASK_APP = environ.get('FLASK_APP', 'wsgi.py')
+    FLASK_ENV = environ.get('FLASK_ENV', 'production')
+    FLASK_DEBUG = environ.get('FLASK_DEBUG', '0')
+    FLASK_HOST = environ.get('FLASK_HOST', '0.0.0.0')
+    FLASK_PORT = environ.get('FLASK_PORT', '5000')
 
     # postgres settings
-    POSTGRES_USER = environ['POSTGRES_USER']
-    POSTGRES_PASSWORD = environ['POSTGRES_PASSWORD']
-    POSTGRES_DB = environ['POSTGRES_DB']
+    POSTGRES_USER = environ.get('POSTGRES_USER', '')
+    POSTGRES_PASSWORD = environ.get('POSTGRES_PASSWORD', '')
+    POSTGRES_DB = environ.get('POSTGRES_DB', '')
 
-    # sqlalchemy settings
-    SQLALCHEMY_DATABASE_URI = environ['SQLALCHEMY_DATABASE_URI']
+    # sqlalchemy settings - there is no default db, create_app() refuses
+    # to start without one
+    SQLALCHEMY_DATABASE_URI = environ.get('SQLALCHEMY_DATABASE_URI')
     SQLALCHEMY_TRACK_MODIFICATIONS = convert_bool(
-        environ['SQLALCHEMY_TRACK_MODIFICATIONS'])
+        environ.get('SQLALCHEMY_TRACK_MODIFICATIONS', 'False'))
 
     # gmail settings
-    GMAIL_USERNAME = environ['GMAIL_USERNAME']
-    GMAIL_PASSWORD = environ['GMAIL_PASSWORD']
+    GMAIL_USERNAME = environ.get('GMAIL_USERNAME', '')
+    GMAIL_PASSWORD = environ.get('GMAIL_PASSWORD', '')
+
+    # outbox worker settings - point MAIL_HOST/MAIL_PORT at a local
+    # stand-in (python -m smtpd -n -c DebuggingServer localhost:1025) with
+    # MAIL_SSL, MAIL_STARTTLS and MAIL_SKIP_LOGIN to test without gmail
+    MAIL_HOST = environ.get('MAIL_HOST', 'smtp.gmail.com')
+    MAIL_PORT = int(environ.get('MAIL_PORT', 465))
+    MAIL_SSL = convert_bool(environ.get('MAIL_SSL', 'True'))
+    MAIL_STARTTLS = convert_bool(environ.get('MAIL_STARTTLS', 'False'))
+    MAIL_SKIP_LOGIN = convert_bool(environ.get('MAIL_SKIP_LOGIN', 'False'))
+    MAIL_WORKERS = int(environ.get('MAIL_WORKERS', 4))
+    MAIL_IDLE_TIMEOUT = int(environ.get('MAIL_IDLE_TIMEOUT', 30))
+    MAIL_BATCH_SIZE = int(environ.get('MAIL_BATCH_SIZE', 50))
+    MAIL_POLL_INTERVAL = float(environ.get('MAIL_POLL_INTERVAL', 2))
+    MAIL_MAX_ATTEMPTS = int(environ.get('MAIL_MAX_ATTEMPTS', 5))
+    MAIL_RETRY_BACKOFF = int(environ.get('MAIL_RETRY_BACKOFF', 60))
+    # seconds a worker has to send a claimed batch before the emails it
+    # hasn't sent are handed to another worker
+    MAIL_LEASE = int(environ.get('MAIL_LEASE', 600))
 
     # init settings
-    INIT_TEST_DATA = convert_bool(environ['INIT_TEST_DATA'])
-    INIT_ADMIN_DATA = convert_bool(environ['INIT_ADMIN_DATA'])
+    INIT_TEST_DATA = convert_bool(environ.get('INIT_TEST_DATA', 'False'))
+    INIT_ADMIN_DATA = convert_bool(environ.get('INIT_ADMIN_DATA', 'False'))
 
     # main page settings
-    SHOW_MAIN_ALERTS = convert_bool(environ['SHOW_MAIN_ALERTS'])
+    SHOW_MAIN_ALERTS = convert_bool(environ.get('SHOW_MAIN_ALERTS', 'True'))
+
+    # cache settings
+    CACHE_BACKEND = environ.get('CACHE_BACKEND', 'memory')
+    CACHE_REDIS_URL = environ.get('CACHE_REDIS_URL', '')
+    CACHE_TTL = int(environ.get('CACHE_TTL', 300))
+    CACHE_MAXSIZE = int(environ.get('CACHE_MAXSIZE', 128))
+    # signed in admins are re-checked against the db at least this often
+    ADMIN_CACHE_TTL = int(environ.get('ADMIN_CACHE_TTL', 60))
+    # racers, series and videos for the admin forms are kept between
+    # requests for this long, 0 loads them once per request
+    REGISTRY_TTL = int(environ.get('REGISTRY_TTL', 0))
+    # the data version behind the public pages' ETags is re-read at least
+    # this often, and nginx keeps anonymous copies for MICROCACHE_TTL
+    DATA_VERSION_TTL = int(environ.get('DATA_VERSION_TTL', 5))
+    MICROCACHE_TTL = int(environ.get('MICROCACHE_TTL', 1))
+    # rendered data table pages kept by each worker, see app/fragments.py
+    FRAGMENT_CACHE_SIZE = int(environ.get('FRAGMENT_CACHE_SIZE', 256))
+
+    # publish mode - with PUBLISH_DIR set, the public pages are rendered
+    # to static files there for nginx, PUBLISH_DELAY seconds after a write
+    PUBLISH_DIR = environ.get('PUBLISH_DIR', '')
+    PUBLISH_DELAY = float(environ.get('PUBLISH_DELAY', 1))
+
+    # query profiling settings - statements slower than SLOW_QUERY_MS are
+    # logged, and each request logs its PROFILE_SLOWEST slowest at DEBUG
+    PROFILE_QUERIES = convert_bool(environ.get('PROFILE_QUERIES', 'True'))
+    SLOW_QUERY_MS = float(environ.get('SLOW_QUERY_MS', 100))
+    PROFILE_SLOWEST = int(environ.get('PROFILE_SLOWEST', 3))
+
+    # metrics settings - served at /metrics, see app/metrics.py
+    METRICS_ENABLED = convert_bool(environ.get('METRICS_ENABLED', 'True'))
+
+    # session settings - SESSION_BACKEND is one of cookie (signed cookie),
+    # db (web_session table) or file (SESSION_FILE_DIR, which must be a
+    # shared volume when running more than one app container)
+    SESSION_BACKEND = environ.get('SESSION_BACKEND', 'cookie')
+    SESSION_FILE_DIR = environ.get('SESSION_FILE_DIR',
+                                   '/tmp/marbles-sessions')
+    SESSION_SWEEP_INTERVAL = int(environ.get('SESSION_SWEEP_INTERVAL', 3600))
+    PERMANENT_SESSION_LIFETIME = int(
+        environ.get('PERMANENT_SESSION_LIFETIME', 31 * 24 * 3600))
+
+    # live standings settings - each viewer holds one gunicorn thread, so
+    # keep SSE_MAX_CLIENTS below the number of threads per worker (viewers
+    # turned away poll /standings instead)
+    SSE_MAX_CLIENTS = int(environ.get('SSE_MAX_CLIENTS', 128))
+    SSE_HEARTBEAT = int(environ.get('SSE_HEARTBEAT', 15))
+    SSE_TIMEOUT = int(environ.get('SSE_TIMEOUT', 300))
 
     # random env vars
-    SITE_URL = environ['SITE_URL']
+    SITE_URL = environ.get('SITE_URL', 'localhost')
+
+
+class TestConfig(Config):
+    '''
+    Self-contained settings for benchmarks and local perf tests: an
+    embedded SQLite db and no external services, so runs on a single
+    machine are comparable. Select it with MARBLES_CONFIG=config.TestConfig
+    and point TEST_DATABASE_URI at a sqlite file to keep the data between
+    runs (the default in-memory db lives as long as the process).
+    '''
+
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = environ.get('TEST_DATABASE_URI', 'sqlite://')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    INIT_TEST_DATA = False
+    INIT_ADMIN_DATA = True
+    CACHE_BACKEND = 'memory'
+    SESSION_BACKEND = 'cookie'
+    PUBLISH_DIR = ''
+    METRICS_ENABLED = False
+    SITE_URL = 'localhost'
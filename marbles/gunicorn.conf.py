@@ -0,0 +1,37 @@
+# gunicorn.conf.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Gunicorn settings, read automatically from the
+# working directory. Points prometheus_client at a
+# directory shared by every worker process so that
+# /metrics reports totals across all of them. Workers
+# run threads so that live standings streams don't
+# each hold a whole worker.
+
+import shutil
+from os import environ, makedirs
+
+# set before any worker imports prometheus_client
+metrics_dir = environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                                 '/tmp/marbles-metrics')
+
+
+# every viewer of /standings/stream holds a thread for up to SSE_TIMEOUT,
+# so threads are sized for SSE_MAX_CLIENTS viewers per worker plus the
+# threads left for ordinary requests (a waiting stream costs a blocked
+# thread, not a CPU). The defaults take 4 x 128 viewers per container.
+worker_class = 'gthread'
+workers = int(environ.get('WEB_CONCURRENCY', 4))
+threads = int(environ.get('GUNICORN_THREADS', 160))
+
+
+def on_starting(server):
+    # values left by a previous run would be added to the new ones
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    makedirs(metrics_dir)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
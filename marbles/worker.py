@@ -0,0 +1,24 @@
+# worker.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# ------------------------
+# Runs the outbox worker that sends all outgoing
+# mail. Run as many copies as needed:
+# `python worker.py`
+
+import logging
+import signal
+
+from app import create_app
+from app.mailer import OutboxWorker
+
+app = create_app()
+
+if __name__ == '__main__':
+    app.logger.setLevel(logging.INFO)
+    worker = OutboxWorker(app)
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+    worker.start()
+    app.logger.info('Outbox worker started')
+    worker.join()